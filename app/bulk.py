@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import outbox, search, storage, tables
+from app.cache import page_cache
+from app.models import PostCreate, UserCreate
+from app.security import hashing
+
+# Rows validated, checked and inserted per transaction.
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    def __init__(self) -> None:
+        self.inserted = 0
+        self.rejected = 0
+        self.errors: list[dict[str, Any]] = []
+        self.seconds = 0.0
+        self._started = time.perf_counter()
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def finish(self) -> "ImportReport":
+        self.seconds = time.perf_counter() - self._started
+        return self
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "rowsPerSecond": round(self.rows_per_second, 1),
+        }
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    # Re-splits an arbitrary byte stream (e.g. a request body) into lines.
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc']) or 'line'}: {e['msg']}" for e in error.errors())
+
+
+async def _batches(
+    lines: AsyncIterable[bytes], model: type[BaseModel], report: ImportReport
+) -> AsyncIterator[list[tuple[int, Any]]]:
+    batch: list[tuple[int, Any]] = []
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            batch.append((number, model.model_validate(orjson.loads(line))))
+        except orjson.JSONDecodeError:
+            report.reject(number, "invalid JSON")
+        except ValidationError as e:
+            report.reject(number, _describe(e))
+        if len(batch) == IMPORT_CHUNK_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def import_posts(session: AsyncSession, lines: AsyncIterable[bytes]) -> ImportReport:
+    report = ImportReport()
+    async for batch in _batches(lines, PostCreate, report):
+        author_ids = {post.author_id for _, post in batch}
+        stmt = select(tables.User.id).where(tables.User.id.in_(author_ids))
+        known = set((await session.execute(stmt)).scalars())
+
+        rows = []
+        tags = []
+        for number, post in batch:
+            if post.author_id not in known:
+                report.reject(number, "author does not exist")
+                continue
+            rows.append({"author_id": post.author_id, "title": post.title, "content": post.content})
+            tags.append(post.tags)
+        if not rows:
+            continue
+
+        # The search index is fed from RETURNING itself, so row order only matters when
+        # tags have to be matched back to ids. Asking for it makes SQLAlchemy fall back to
+        # one INSERT per row on SQLite, so untagged chunks skip it.
+        tagged = any(tags)
+        stmt = insert(tables.Post).returning(
+            tables.Post.id, tables.Post.title, tables.Post.content, sort_by_parameter_order=tagged
+        )
+        inserted = (await session.execute(stmt, rows)).mappings().all()
+        await search.index_new_posts(session, [dict(row) for row in inserted])
+        if tagged:
+            await storage.link_tags(session, {row["id"]: names for row, names in zip(inserted, tags, strict=True)})
+        await outbox.enqueue(session, storage.FAN_OUT_EVENT, [{"post_ids": [row["id"] for row in inserted]}])
+        await session.commit()
+        outbox.notify()
+        report.inserted += len(rows)
+
+    if report.inserted:
+        page_cache.invalidate("posts", "search")
+    return report.finish()
+
+
+async def import_users(session: AsyncSession, lines: AsyncIterable[bytes]) -> ImportReport:
+    report = ImportReport()
+    async for batch in _batches(lines, UserCreate, report):
+        emails = {user.email for _, user in batch}
+        logins = {user.login for _, user in batch}
+        stmt = select(tables.User.email, tables.User.login).where(
+            or_(tables.User.email.in_(emails), tables.User.login.in_(logins))
+        )
+        taken_emails: set[str] = set()
+        taken_logins: set[str] = set()
+        for row in await session.execute(stmt):
+            taken_emails.add(row.email)
+            taken_logins.add(row.login)
+
+        accepted: list[tuple[int, UserCreate]] = []
+        for number, user in batch:
+            if user.email in taken_emails or user.login in taken_logins:
+                report.reject(number, "email or login already exists")
+                continue
+            taken_emails.add(user.email)
+            taken_logins.add(user.login)
+            accepted.append((number, user))
+        if not accepted:
+            continue
+
+        # The hashing pool bounds how many run at once.
+        hashes = await asyncio.gather(*(hashing.hash(user.password) for _, user in accepted))
+        rows = [
+            (number, {"email": user.email, "login": user.login, "password_hash": pw_hash})
+            for (number, user), pw_hash in zip(accepted, hashes, strict=True)
+        ]
+        try:
+            await session.execute(insert(tables.User), [row for _, row in rows])
+            await session.commit()
+            report.inserted += len(rows)
+        except IntegrityError:
+            # Someone registered one of these since the check above: redo the chunk row by
+            # row so only the conflicting lines are rejected.
+            await session.rollback()
+            for number, row in rows:
+                try:
+                    await session.execute(insert(tables.User), row)
+                    await session.commit()
+                    report.inserted += 1
+                except IntegrityError:
+                    await session.rollback()
+                    report.reject(number, "email or login already exists")
+
+    return report.finish()
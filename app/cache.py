@@ -0,0 +1,198 @@
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from typing import Any, NamedTuple
+
+from app.database import READ_REPLICA_URLS, READ_YOUR_WRITES_SECONDS
+from app.models import User
+from app.security import peek_claims
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "2048"))
+# Invalidation only reaches the process that made the write; this bounds how long other
+# workers (or a server whose data a CLI command changed) keep serving an old page.
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "30"))
+# Pages render from get_read_db; with replicas, one rendered this soon after a write to
+# any of its tags may have read pre-write rows, so it is served but not stored.
+PAGE_CACHE_REPLICA_LAG = READ_YOUR_WRITES_SECONDS if READ_REPLICA_URLS else 0.0
+RECENT_TAGS_MAX = 10_000
+
+
+class LRUCache:
+    """Size-bounded LRU mapping with an optional per-entry time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        # Like get(), but ignores expiry and leaves recency and counters untouched.
+        item = self._data.get(key)
+        return default if item is None else item[0]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def keys(self) -> list[Hashable]:
+        return list(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class AuthenticatedUser(NamedTuple):
+    claims: dict
+    user: User
+
+
+class UserCache:
+    """Decoded claims and validated User per session token, keyed on (signature, user id).
+
+    The signature is the HMAC over the claims, so a tampered payload never hits an entry
+    stored for the genuine token. Entries never outlive the token's ``exp``; the cache is
+    per process, so other workers converge within the TTL after ``invalidate_user``.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL) -> None:
+        self._entries = LRUCache(maxsize, ttl)
+
+    @staticmethod
+    def _key(token: str) -> tuple[str, str] | None:
+        claims = peek_claims(token)
+        if claims is None or claims.get("sub") is None:
+            return None
+        return token.rsplit(".", 1)[-1], str(claims["sub"])
+
+    def get(self, token: str) -> AuthenticatedUser | None:
+        key = self._key(token)
+        if key is None:
+            return None
+        return self._entries.get(key)
+
+    def put(self, token: str, claims: dict, user: User) -> None:
+        key = self._key(token)
+        if key is None:
+            return
+        ttl = self._entries.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        if ttl > 0:
+            self._entries.set(key, AuthenticatedUser(claims, user), ttl=ttl)
+
+    def invalidate_user(self, user_id: int) -> None:
+        subject = str(user_id)
+        for key in self._entries.keys():
+            if key[1] == subject:
+                self._entries.pop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return self._entries.stats()
+
+
+user_cache = UserCache()
+
+
+class PageCache:
+    """Rendered HTML pages, invalidated by tags such as ``post:12`` or ``user:3``.
+
+    Writers call ``invalidate`` after committing. A render that started before an
+    invalidation is not stored (see ``generation``), so a slow request can never put a
+    page built from pre-write rows back into the cache. Nor is one tagged with anything
+    invalidated in the last ``replica_lag`` seconds, which a lagging replica may not have
+    caught up with yet.
+
+    The cache is per process, so entries also expire after ``ttl`` seconds: with several
+    workers, the ones that didn't handle a write catch up within that.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = PAGE_CACHE_SIZE,
+        ttl: float = PAGE_CACHE_TTL,
+        replica_lag: float = PAGE_CACHE_REPLICA_LAG,
+    ) -> None:
+        self._entries = LRUCache(maxsize, ttl)
+        self.generation = 0
+        self.replica_lag = replica_lag
+        self._invalidated: dict[str, float] = {}
+        self._cleared_until = 0.0
+
+    def get(self, key: Hashable) -> str | None:
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def set(self, key: Hashable, html: str, tags: Iterable[str], generation: int) -> None:
+        if generation != self.generation:
+            return
+        tags = frozenset(tags)
+        if self.replica_lag and self._recently_invalidated(tags):
+            return
+        self._entries.set(key, (html, tags))
+
+    def _recently_invalidated(self, tags: frozenset[str]) -> bool:
+        now = time.monotonic()
+        return self._cleared_until > now or any(self._invalidated.get(tag, 0.0) > now for tag in tags)
+
+    def invalidate(self, *tags: str) -> None:
+        self.generation += 1
+        if self.replica_lag:
+            now = time.monotonic()
+            if len(self._invalidated) >= RECENT_TAGS_MAX:
+                self._invalidated = {tag: until for tag, until in self._invalidated.items() if until > now}
+            for tag in tags:
+                self._invalidated[tag] = now + self.replica_lag
+        stale = set(tags)
+        for key in self._entries.keys():
+            entry = self._entries.peek(key)
+            if entry is not None and not stale.isdisjoint(entry[1]):
+                self._entries.pop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+        if self.replica_lag:
+            self._cleared_until = time.monotonic() + self.replica_lag
+
+    def stats(self) -> dict[str, int]:
+        return self._entries.stats()
+
+
+page_cache = PageCache()
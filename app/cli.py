@@ -0,0 +1,134 @@
+import argparse
+import asyncio
+import sys
+import time
+from collections.abc import AsyncIterator
+
+from app import bulk, search, storage, synthetic
+from app.database import ReadSessionLocal, SessionLocal, engine
+from app.responses import POST_FIELDS, USER_FIELDS, csv_lines, ndjson_lines, post_record, user_record
+
+
+async def reindex_search() -> None:
+    async with SessionLocal() as session:
+        count = await search.rebuild_index(session)
+    print(f"indexed {count} posts")
+
+
+async def repair_counts() -> None:
+    async with SessionLocal() as session:
+        fixed_favorites = await storage.repair_favorite_counts(session)
+        fixed_comments = await storage.repair_comment_counts(session)
+        fixed_tags = await storage.repair_tag_counts(session)
+    print(
+        f"fixed favorite counts on {fixed_favorites} posts, comment counts on {fixed_comments} posts "
+        f"and post counts on {fixed_tags} tags"
+    )
+
+
+async def _file_lines(path: str) -> AsyncIterator[bytes]:
+    with open(sys.stdin.fileno(), "rb", closefd=False) if path == "-" else open(path, "rb") as f:
+        for line in f:
+            yield line
+
+
+async def import_data(kind: str, path: str) -> None:
+    importer = bulk.import_posts if kind == "posts" else bulk.import_users
+    async with SessionLocal() as session:
+        report = await importer(session, _file_lines(path))
+    for error in report.errors:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(
+        f"imported {report.inserted} {kind}, rejected {report.rejected} "
+        f"in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)"
+    )
+
+
+async def export_data(kind: str, fmt: str, path: str) -> None:
+    count = 0
+
+    async def counted(chunks):
+        nonlocal count
+        async for rows in chunks:
+            count += len(rows)
+            yield rows
+
+    started = time.perf_counter()
+    async with ReadSessionLocal() as session:
+        if kind == "posts":
+            chunks, serialize, fields = storage.stream_posts(session), post_record, POST_FIELDS
+        else:
+            chunks, serialize, fields = storage.stream_users(session), user_record, USER_FIELDS
+        if fmt == "csv":
+            body = csv_lines(counted(chunks), serialize, fields)
+        else:
+            body = ndjson_lines(counted(chunks), serialize)
+        with open(sys.stdout.fileno(), "wb", closefd=False) if path == "-" else open(path, "wb") as f:
+            async for data in body:
+                f.write(data)
+    seconds = time.perf_counter() - started
+    rate = count / seconds if seconds else 0.0
+    # stdout may be the export itself, so the summary goes to stderr.
+    print(f"exported {count} {kind} in {seconds:.2f}s ({rate:.0f} rows/s)", file=sys.stderr)
+
+
+async def generate(spec: synthetic.Spec) -> None:
+    async with synthetic.loading_session(engine) as session:
+        report = await synthetic.generate(session, spec)
+    for table, count in report.rows.items():
+        print(f"{table:>14} {count:>10}")
+    print(f"generated {report.total} rows in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Blog maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("reindex-search", help="rebuild the full-text search index from the posts table")
+    commands.add_parser("repair-counts", help="recompute denormalized counters from their source tables")
+
+    import_cmd = commands.add_parser("import", help="bulk-load posts or users from an NDJSON file")
+    import_cmd.add_argument("kind", choices=["posts", "users"])
+    import_cmd.add_argument("path", help="NDJSON file, or - for stdin")
+
+    export_cmd = commands.add_parser("export", help="dump posts or users as NDJSON or CSV")
+    export_cmd.add_argument("kind", choices=["posts", "users"])
+    export_cmd.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export_cmd.add_argument("-o", "--output", default="-", help="output file, or - for stdout")
+
+    generate_cmd = commands.add_parser("generate", help="append a deterministic synthetic dataset")
+    defaults = synthetic.Spec()
+    for name in ("users", "posts", "favorites", "subscriptions", "comments", "tags", "seed"):
+        generate_cmd.add_argument(f"--{name}", type=int, default=getattr(defaults, name))
+    generate_cmd.add_argument("--skew", type=float, default=defaults.skew, help="Zipf exponent of the activity skew")
+    generate_cmd.add_argument("--password", default=defaults.password, help="password of every generated user")
+
+    args = parser.parse_args(argv)
+    if args.command == "reindex-search":
+        asyncio.run(reindex_search())
+    elif args.command == "repair-counts":
+        asyncio.run(repair_counts())
+    elif args.command == "import":
+        asyncio.run(import_data(args.kind, args.path))
+    elif args.command == "export":
+        asyncio.run(export_data(args.kind, args.format, args.output))
+    elif args.command == "generate":
+        spec = synthetic.Spec(
+            users=args.users,
+            posts=args.posts,
+            favorites=args.favorites,
+            subscriptions=args.subscriptions,
+            comments=args.comments,
+            tags=args.tags,
+            seed=args.seed,
+            skew=args.skew,
+            password=args.password,
+        )
+        try:
+            spec.validate()
+        except ValueError as e:
+            parser.error(str(e))
+        asyncio.run(generate(spec))
+
+
+if __name__ == "__main__":
+    main()
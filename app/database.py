@@ -1,17 +1,185 @@
 import os
+import time
+from collections.abc import Sequence
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
+from app.metrics import METRICS_ENABLED, TimedQueuePool, instrument_engine
+from app.profiling import PROFILE_REQUESTS
+from app.security import peek_claims
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-)
+# "development" keeps a single engine with SQL echo; "production" tunes SQLite and splits
+# reads (a pool of query_only connections) from writes (one serialized connection).
+DB_PROFILE = os.getenv("DB_PROFILE", "development")
+DB_ECHO = os.getenv("DB_ECHO", "1" if DB_PROFILE == "development" else "0") == "1"
+
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "1"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Comma-separated replica URLs for get_read_db; empty means every read goes to the primary.
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+STICKY_USERS_MAX = 10_000
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def sqlite_pragmas(read_only: bool) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        # WAL is persistent in the file, so the writer setting it once covers every reader.
+        pragmas += ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]
+    return pragmas
+
+
+def make_engine(
+    url: str = DATABASE_URL, *, read_only: bool = False, profile: str = DB_PROFILE, pre_ping: bool = False
+) -> AsyncEngine:
+    kwargs: dict = {"echo": DB_ECHO, "pool_pre_ping": pre_ping}
+    if is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if profile == "production":
+        # aiosqlite file databases default to NullPool; a real pool keeps connections (and
+        # their page cache and mmap) alive between requests. The name labels its wait times.
+        kwargs.update(
+            poolclass=TimedQueuePool, pool_timeout=DB_POOL_TIMEOUT, pool_logging_name="read" if read_only else "write"
+        )
+        if read_only:
+            kwargs.update(pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_MAX_OVERFLOW)
+        elif is_sqlite(url):
+            # SQLite allows one writer at a time; queue writers in the pool instead of
+            # letting them collide on the file lock.
+            kwargs.update(pool_size=DB_WRITE_POOL_SIZE, max_overflow=0)
+        else:
+            kwargs.update(pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_MAX_OVERFLOW)
+
+    new_engine = create_async_engine(url, **kwargs)
+
+    if is_sqlite(url):
+        # storage relies on foreign keys to reject writes that reference missing rows.
+        pragmas = ["PRAGMA foreign_keys=ON"]
+        if profile == "production":
+            pragmas += sqlite_pragmas(read_only)
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    if METRICS_ENABLED or PROFILE_REQUESTS:
+        instrument_engine(new_engine)
+    return new_engine
+
+
+engine = make_engine()
+read_engine = make_engine(read_only=True) if DB_PROFILE == "production" else engine
 
 SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class Replica:
+    def __init__(self, url: str, profile: str = DB_PROFILE) -> None:
+        self.url = url
+        self.engine = make_engine(url, read_only=True, profile=profile, pre_ping=True)
+        self.sessionmaker = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.down_until = 0.0
+
+
+class ReadRouter:
+    """Picks the database behind a read-only session.
+
+    Replicas are used in round-robin order; one that fails to connect is skipped for
+    ``retry_after`` seconds, and with none available reads fall back to the primary.
+    A user who has just written is pinned to the primary for ``sticky_for`` seconds so
+    they see their own changes despite replication lag.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker[AsyncSession],
+        replica_urls: Sequence[str] = (),
+        *,
+        retry_after: float = REPLICA_RETRY_SECONDS,
+        sticky_for: float = READ_YOUR_WRITES_SECONDS,
+        profile: str = DB_PROFILE,
+    ) -> None:
+        self.primary = primary
+        self.replicas = [Replica(url, profile) for url in replica_urls]
+        self.retry_after = retry_after
+        self.sticky_for = sticky_for
+        self._next = 0
+        self._sticky: dict[int, float] = {}
+
+    def note_write(self, user_id: int) -> None:
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._sticky) >= STICKY_USERS_MAX:
+            self._sticky = {uid: until for uid, until in self._sticky.items() if until > now}
+        self._sticky[user_id] = now + self.sticky_for
+
+    def is_sticky(self, user_id: int | None) -> bool:
+        if user_id is None:
+            return False
+        until = self._sticky.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._sticky[user_id]
+            return False
+        return True
+
+    async def open_session(self, user_id: int | None = None) -> AsyncSession:
+        if self.replicas and not self.is_sticky(user_id):
+            now = time.monotonic()
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica.down_until > now:
+                    continue
+                session = replica.sessionmaker()
+                try:
+                    # Check out (and pre-ping) a connection now so a dead replica fails
+                    # over here instead of in the middle of the route.
+                    await session.connection()
+                except (DBAPIError, OSError):
+                    await session.close()
+                    replica.down_until = now + self.retry_after
+                    continue
+                return session
+        return self.primary()
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+read_router = ReadRouter(ReadSessionLocal, READ_REPLICA_URLS)
 
 
 class Base(DeclarativeBase):
@@ -21,3 +189,21 @@ class Base(DeclarativeBase):
 async def get_db():
     async with SessionLocal() as session:
         yield session
+
+
+def request_user_id(request: Request) -> int | None:
+    # Only used to route reads, so the unverified subject is good enough: a forged token
+    # can at most send its own reads to the primary.
+    token = request.cookies.get("access_token")
+    if not token:
+        return None
+    claims = peek_claims(token.removeprefix("Bearer "))
+    try:
+        return int(claims["sub"]) if claims else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def get_read_db(request: Request):
+    async with await read_router.open_session(request_user_id(request)) as session:
+        yield session
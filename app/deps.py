@@ -2,12 +2,13 @@ from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import storage
-from app.database import get_db
+from app.cache import user_cache
+from app.database import get_read_db
 from app.models import User
 from app.security import decode_access_token
 
 
-async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> User | None:
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_read_db)) -> User | None:
     token = request.cookies.get("access_token")
     if not token:
         return None
@@ -15,6 +16,10 @@ async def get_current_user(request: Request, db: AsyncSession = Depends(get_db))
     if token.startswith("Bearer "):
         token = token.split(" ")[1]
 
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached.user
+
     payload = decode_access_token(token)
     if payload is None:
         return None
@@ -27,7 +32,9 @@ async def get_current_user(request: Request, db: AsyncSession = Depends(get_db))
         user_id = int(username)
         user_orm = await storage.get_user(db, user_id)
         if user_orm:
-            return User.model_validate(user_orm)
+            user = User.model_validate(user_orm)
+            user_cache.put(token, payload, user)
+            return user
     except ValueError:
         pass
 
@@ -1,67 +1,208 @@
-from pathlib import Path
+from contextlib import asynccontextmanager
 
 from fastapi import Depends, FastAPI, Form, HTTPException, Request, Response, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
+from markupsafe import Markup
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
-from app.database import get_db
+from app.database import SessionLocal, engine, get_db, get_read_db, read_engine, read_router
 from app.deps import get_current_user
 
-from . import storage
-from .models import PostCreate, PostUpdate, User
+from . import metrics, outbox, profiling, search, storage
+from .cache import page_cache, user_cache
+from .conditional import is_not_modified, make_etag, not_modified, validator_headers
+from .models import CommentCreate, PostCreate, PostUpdate, User
+from .profiling import query_budget
 from .routes.auth import router as auth_router
+from .routes.bulk import router as bulk_router
 from .routes.favorites import router as favorites_router
+from .routes.follows import router as follows_router
 from .routes.posts import router as posts_router
 from .routes.profile import router as profile_router
+from .routes.tags import router as tags_router
 from .routes.users import router as users_router
+from .security import hashing
+from .templating import StreamingTemplateResponse, precompile_templates, render_template
 
-app = FastAPI(title="Simple Blog API")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    precompile_templates()
+    if outbox.OUTBOX_WORKER:
+        # Also picks up whatever was queued before the last shutdown.
+        outbox.worker.start(SessionLocal)
+    yield
+    await outbox.worker.stop()
+    hashing.shutdown()
+    await read_router.dispose()
+    await read_engine.dispose()
+    await engine.dispose()
+
+
+app = FastAPI(title="Simple Blog API", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+# Added last, so metrics wraps the profiler and both share one RequestStats per request.
+app.add_middleware(profiling.ProfilerMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(users_router)
 app.include_router(posts_router)
 app.include_router(auth_router)
 app.include_router(profile_router)
 app.include_router(favorites_router)
+app.include_router(bulk_router)
+app.include_router(follows_router)
+app.include_router(tags_router)
+
+
+def _pool_connections():
+    pools = {"write": engine.sync_engine.pool, "read": read_engine.sync_engine.pool}
+    for name, pool in pools.items():
+        # Only queue pools (the production profile) keep connections checked out.
+        if hasattr(pool, "checkedout"):
+            yield (name,), pool.checkedout()
+
+
+metrics.registry.gauge(
+    "db_pool_connections_in_use", "Connections currently checked out", ("pool",), collect=_pool_connections
+)
+
 
+def _user_cache_lookups():
+    stats = user_cache.stats()
+    yield ("hit",), stats["hits"]
+    yield ("miss",), stats["misses"]
 
-TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+
+metrics.registry.gauge(
+    "user_cache_entries",
+    "Sessions held by the authenticated-user cache",
+    collect=lambda: [((), user_cache.stats()["size"])],
+)
+metrics.registry.gauge(
+    "user_cache_lookups",
+    "User cache lookups since the cache was last cleared",
+    ("result",),
+    collect=_user_cache_lookups,
+)
+
+
+def _hashing_tasks():
+    stats = hashing.stats()
+    yield ("queued",), stats["queued"]
+    yield ("running",), stats["running"]
+
+
+metrics.registry.gauge(
+    "password_hashing_tasks", "bcrypt calls waiting for or running on the executor", ("state",), collect=_hashing_tasks
+)
+metrics.registry.gauge(
+    "password_hashing_queue_peak",
+    "Most bcrypt calls ever waiting at once",
+    collect=lambda: [((), hashing.stats()["max_queued"])],
+)
+metrics.registry.gauge(
+    "password_hashing_completed",
+    "bcrypt calls finished on the executor",
+    collect=lambda: [((), hashing.stats()["completed"])],
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint() -> Response:
+    return Response(metrics.registry.render(), media_type=metrics.EXPOSITION_MEDIA_TYPE)
 
 
 @app.get("/", response_class=HTMLResponse)
+@query_budget(5)
 async def index(
     request: Request,
     q: str | None = None,
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
-) -> HTMLResponse:
-    posts = await storage.list_posts(db, search_query=q)
-    users = await storage.list_users(db)
-    user_id_to_login: dict[int, str] = {u.id: u.login for u in users}
-    return templates.TemplateResponse(
+) -> Response:
+    # Logged-in pages carry the viewer's name in the header, so each viewer gets a variant.
+    viewer_id = user.id if user else 0
+    cache_key = ("search", q, cursor, viewer_id) if q else ("index", cursor, viewer_id)
+    cached = page_cache.get(cache_key)
+    if cached is not None:
+        return HTMLResponse(cached)
+    generation = page_cache.generation
+
+    # Reject a bad cursor before the 200 status line goes out with the first chunk.
+    try:
+        if cursor is not None and q:
+            search.decode_cursor(cursor)
+        elif cursor is not None:
+            storage.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    # Rows are fetched while the page streams, after the chrome has been flushed.
+    snippets: dict[int, Markup] = {}
+    if q:
+
+        async def search_chunks():
+            page = await search.search_posts(db, q, cursor=cursor)
+            snippets.update(page.snippets)
+            posts.next_cursor = page.next_cursor
+            yield page.items
+
+        posts = storage.PostListing(db, search_chunks())
+    else:
+        chunks = storage.stream_posts(db, cursor=cursor, limit=storage.POSTS_PAGE_SIZE + 1)
+        posts = storage.PostListing(db, chunks, limit=storage.POSTS_PAGE_SIZE)
+
+    def cache_page(html: str) -> None:
+        # A new post only ever lands on the first page: later keyset pages stay valid.
+        tags = {f"user:{viewer_id}"}
+        tags.update(f"post:{post_id}" for post_id in posts.post_ids)
+        tags.update(f"user:{author_id}" for author_id in posts.logins)
+        if q:
+            tags.add("search")
+        elif cursor is None:
+            tags.add("posts")
+        page_cache.set(cache_key, html, tags, generation)
+
+    return StreamingTemplateResponse(
         "index.html",
-        {
-            "request": request,
-            "posts": posts,
-            "user_id_to_login": user_id_to_login,
-            "user": user,
-            "search_query": q,
-        },
+        {"request": request, "posts": posts, "user": user, "search_query": q, "snippets": snippets},
+        on_complete=cache_page,
+        background=BackgroundTask(db.close),
+    )
+
+
+@app.get("/popular", response_class=HTMLResponse)
+@query_budget(3)
+async def popular(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    user: User | None = Depends(get_current_user),
+) -> Response:
+    async def leaderboard():
+        yield await storage.list_most_favorited(db)
+
+    return StreamingTemplateResponse(
+        "popular.html",
+        {"request": request, "posts": storage.PostListing(db, leaderboard()), "user": user},
+        background=BackgroundTask(db.close),
     )
 
 
 @app.get("/html/posts/new", response_class=HTMLResponse)
 async def html_post_new(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
 ) -> Response:
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
-    return templates.TemplateResponse(
+    return await render_template(
         "post_form.html",
         {"request": request, "mode": "create", "users": [user], "post": None, "user": user},
     )
@@ -72,6 +213,7 @@ async def html_post_new_post(
     request: Request,
     title: str = Form(...),
     content: str = Form(...),
+    tags: str = Form(""),
     db: AsyncSession = Depends(get_db),
     user: User | None = Depends(get_current_user),
 ) -> Response:
@@ -79,11 +221,11 @@ async def html_post_new_post(
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
     try:
-        post = PostCreate(title=title, content=content, author_id=user.id)
+        post = PostCreate(title=title, content=content, author_id=user.id, tags=tags.split(","))
         created = await storage.create_post(db, post)
         return RedirectResponse(url=f"/html/posts/{created.id}", status_code=303)
     except ValueError as e:
-        return templates.TemplateResponse(
+        return await render_template(
             "post_form.html",
             {
                 "request": request,
@@ -98,32 +240,92 @@ async def html_post_new_post(
 
 
 @app.get("/html/posts/{post_id}", response_class=HTMLResponse)
+@query_budget(7)
 async def html_post_detail(
     post_id: int,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    comments: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
 ) -> HTMLResponse:
-    post = await storage.get_post(db, post_id)
-    if not post:
+    # Anonymous pages only depend on the post, author and commenter rows, so they can be
+    # revalidated from updated_at alone. Logged-in pages also show per-viewer favorite state.
+    headers: dict[str, str] = {}
+    if not user:
+        version = await storage.get_post_page_version(db, post_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="post not found")
+        etag = make_etag("post-page", post_id, *(stamp.isoformat() for stamp in version))
+        headers = {**validator_headers(etag, max(version)), "Vary": "Cookie"}
+        if is_not_modified(request, etag, max(version)):
+            return not_modified(headers)
+
+    # The favorite and edit controls depend on the viewer, so cache one variant per viewer.
+    viewer_id = user.id if user else 0
+    cache_key = ("post", post_id, comments, viewer_id)
+    cached = page_cache.get(cache_key)
+    if cached is not None:
+        return HTMLResponse(cached, headers=headers)
+    generation = page_cache.generation
+
+    found = await storage.get_post_with_author(db, post_id)
+    if not found:
         raise HTTPException(status_code=404, detail="post not found")
-    author = await storage.get_user(db, post.author_id)
+    post, author = found
+    tags = await storage.get_post_tags(db, post_id)
+    try:
+        thread = await storage.list_comments(db, post_id, cursor=comments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-    is_fav = False
+    is_fav = following = False
     if user:
         is_fav = await storage.is_favorited(db, user.id, post.id)
+        if user.id != post.author_id:
+            following = await storage.is_following(db, user.id, post.author_id)
 
-    return templates.TemplateResponse(
+    response = await render_template(
         "post_detail.html",
-        {"request": request, "post": post, "author": author, "user": user, "is_favorited": is_fav},
+        {
+            "request": request,
+            "post": post,
+            "author": author,
+            "tags": tags,
+            "comments": thread,
+            "user": user,
+            "is_favorited": is_fav,
+            "is_following": following,
+        },
+        headers=headers,
     )
+    tags = {f"post:{post_id}", f"user:{post.author_id}", f"user:{viewer_id}"}
+    tags.update(f"user:{author_id}" for author_id in thread.logins)
+    page_cache.set(cache_key, response.body.decode(), tags, generation)
+    return response
+
+
+@app.post("/html/posts/{post_id}/comments", response_class=RedirectResponse)
+async def html_post_comment(
+    post_id: int,
+    content: str = Form(...),
+    db: AsyncSession = Depends(get_db),
+    user: User | None = Depends(get_current_user),
+) -> Response:
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+    try:
+        await storage.create_comment(db, post_id, CommentCreate(author_id=user.id, content=content))
+    except ValueError as e:
+        raise HTTPException(status_code=404 if "not found" in str(e) else 400, detail=str(e)) from e
+    return RedirectResponse(url=f"/html/posts/{post_id}#comments", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.get("/html/posts/{post_id}/edit", response_class=HTMLResponse)
 async def html_post_edit(
     post_id: int,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
 ) -> Response:
     if not user:
@@ -136,9 +338,16 @@ async def html_post_edit(
     if post.author_id != user.id:
         return Response("Forbidden", status_code=403)
 
-    return templates.TemplateResponse(
+    return await render_template(
         "post_form.html",
-        {"request": request, "mode": "edit", "users": [user], "post": post, "user": user},
+        {
+            "request": request,
+            "mode": "edit",
+            "users": [user],
+            "post": post,
+            "tags": await storage.get_post_tags(db, post_id),
+            "user": user,
+        },
     )
 
 
@@ -148,6 +357,7 @@ async def html_post_edit_post(
     request: Request,
     title: str = Form(...),
     content: str = Form(...),
+    tags: str = Form(""),
     db: AsyncSession = Depends(get_db),
     user: User | None = Depends(get_current_user),
 ) -> Response:
@@ -161,7 +371,7 @@ async def html_post_edit_post(
         return Response("Forbidden", status_code=403)
 
     try:
-        await storage.update_post(db, post_id, PostUpdate(title=title, content=content))
+        await storage.update_post(db, post_id, PostUpdate(title=title, content=content, tags=tags.split(",")))
         return RedirectResponse(url=f"/html/posts/{post_id}", status_code=303)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e)) from e
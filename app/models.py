@@ -1,6 +1,20 @@
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+
+MAX_TAGS = 10
+MAX_TAG_LENGTH = 32
+
+
+def normalize_tags(names: list[str]) -> list[str]:
+    tags: list[str] = []
+    for name in names:
+        tag = name.strip().lower()
+        if len(tag) > MAX_TAG_LENGTH:
+            raise ValueError(f"tags are at most {MAX_TAG_LENGTH} characters")
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
 
 
 class UserBase(BaseModel):
@@ -35,15 +49,67 @@ class PostBase(BaseModel):
 
 
 class PostCreate(PostBase):
-    pass
+    tags: list[str] = Field(default_factory=list, max_length=MAX_TAGS)
+
+    @field_validator("tags")
+    @classmethod
+    def _normalize_tags(cls, names: list[str]) -> list[str]:
+        return normalize_tags(names)
 
 
 class PostUpdate(BaseModel):
     title: str | None = Field(default=None, min_length=1, max_length=200)
     content: str | None = Field(default=None, min_length=1)
+    tags: list[str] | None = Field(default=None, max_length=MAX_TAGS)
+
+    @field_validator("tags")
+    @classmethod
+    def _normalize_tags(cls, names: list[str] | None) -> list[str] | None:
+        return None if names is None else normalize_tags(names)
+
+
+class TagCount(BaseModel):
+    name: str
+    post_count: int = Field(alias="postCount")
+
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 
 class Post(PostBase):
     id: int
+    favorite_count: int = Field(default=0, alias="favoriteCount")
+    comment_count: int = Field(default=0, alias="commentCount")
     created_at: datetime = Field(alias="createdAt")
     updated_at: datetime = Field(alias="updatedAt")
+
+
+class PostPage(BaseModel):
+    items: list[Post]
+    next_cursor: str | None = Field(default=None, alias="nextCursor")
+
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+
+class CommentCreate(BaseModel):
+    author_id: int = Field(alias="authorId")
+    content: str = Field(min_length=1, max_length=5000)
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class Comment(BaseModel):
+    id: int
+    post_id: int = Field(alias="postId")
+    author_id: int = Field(alias="authorId")
+    author_login: str | None = Field(default=None, alias="authorLogin")
+    content: str
+    created_at: datetime = Field(alias="createdAt")
+
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+
+class CommentPage(BaseModel):
+    items: list[Comment]
+    next_cursor: str | None = Field(default=None, alias="nextCursor")
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import Row, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import tables
+from app.metrics import LATENCY_BUCKETS, registry
+
+# Off leaves events queued: run the worker in another process, or drain() by hand.
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "1") == "1"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+# The worker also wakes up right after a commit that queued events (see notify()).
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+# A claimed batch not finished within this is handed out again (e.g. the worker died).
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "1"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AsyncSession, list[dict[str, Any]]], Awaitable[None]]
+handlers: dict[str, Handler] = {}
+
+processed = registry.counter("outbox_events_processed_total", "Outbox events handled", ("kind",))
+failures = registry.counter("outbox_event_failures_total", "Outbox event handler failures", ("kind",))
+lag = registry.histogram(
+    "outbox_event_lag_seconds", "Time from enqueue to handled", ("kind",), (*LATENCY_BUCKETS, 30.0, 60.0, 300.0)
+)
+pending = registry.gauge("outbox_pending_events", "Events not yet handled, as of the last drain")
+oldest = registry.gauge("outbox_oldest_event_age_seconds", "Age of the oldest pending event, as of the last drain")
+dead = registry.gauge("outbox_dead_events", "Events that ran out of attempts, as of the last drain")
+
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Registers the batch handler for ``kind``.
+
+    Handlers get all claimed payloads of their kind at once, run in the transaction that
+    deletes the events, and must be idempotent: delivery is at least once.
+    """
+
+    def register(fn: Handler) -> Handler:
+        handlers[kind] = fn
+        return fn
+
+    return register
+
+
+async def enqueue(session: AsyncSession, kind: str, payloads: Iterable[dict[str, Any]]) -> None:
+    """Queues events in the caller's transaction; call notify() once it has committed."""
+    rows = [{"kind": kind, "payload": payload} for payload in payloads]
+    if rows:
+        await session.execute(insert(tables.OutboxEvent), rows)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back naive.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def _claim_statement(limit: int, now: datetime):
+    # One UPDATE ... RETURNING, so concurrent workers never get the same batch: SQLite's
+    # single writer serializes them, and on Postgres SKIP LOCKED makes a second worker
+    # pass over the rows the first has locked instead of leasing them again under READ
+    # COMMITTED. (SQLite renders no FOR UPDATE clause.)
+    event = tables.OutboxEvent.__table__.c
+    due = (
+        select(event.id)
+        .where(event.available_at <= now, event.attempts < OUTBOX_MAX_ATTEMPTS)
+        .order_by(event.available_at, event.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(tables.OutboxEvent.__table__)
+        .where(event.id.in_(due.scalar_subquery()))
+        .values(available_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+        .returning(event.id, event.kind, event.payload, event.created_at, event.attempts)
+    )
+
+
+async def _claim(session: AsyncSession, limit: int) -> list[Row]:
+    # Core rows rather than ORM objects, since a failed handler's rollback would expire those.
+    claimed = (await session.execute(_claim_statement(limit, _now()))).all()
+    await session.commit()
+    return sorted(claimed, key=lambda e: e.id)
+
+
+async def _handle(session: AsyncSession, kind: str, events: list[Row]) -> bool:
+    table = tables.OutboxEvent.__table__
+    ids = [e.id for e in events]
+    try:
+        fn = handlers.get(kind)
+        if fn is None:
+            raise LookupError(f"no outbox handler for {kind!r}")
+        await fn(session, [e.payload for e in events])
+        await session.execute(delete(table).where(table.c.id.in_(ids)))
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        failures.inc(kind, amount=len(events))
+        logger.warning("outbox %s failed for %d events: %s", kind, len(events), e)
+        now = _now()
+        for event in events:
+            attempts = event.attempts + 1
+            stmt = (
+                update(table)
+                .where(table.c.id == event.id)
+                .values(
+                    attempts=attempts,
+                    available_at=now + timedelta(seconds=retry_delay(attempts)),
+                    last_error=f"{type(e).__name__}: {e}"[:1000],
+                )
+            )
+            await session.execute(stmt)
+        await session.commit()
+        return False
+
+    now = _now()
+    for event in events:
+        lag.observe((now - _as_utc(event.created_at)).total_seconds(), kind)
+    processed.inc(kind, amount=len(events))
+    return True
+
+
+async def _observe_backlog(session: AsyncSession) -> None:
+    event = tables.OutboxEvent
+    live = event.attempts < OUTBOX_MAX_ATTEMPTS
+    count, first = (await session.execute(select(func.count(), func.min(event.created_at)).where(live))).one()
+    pending.set(count)
+    oldest.set((_now() - _as_utc(first)).total_seconds() if first else 0.0)
+    dead.set((await session.execute(select(func.count()).where(~live))).scalar_one())
+    await session.commit()
+
+
+async def drain(session_factory: async_sessionmaker[AsyncSession], batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Handles due events until none are left; returns how many were handled.
+
+    Each batch is claimed in one transaction, then each kind in it is handled and deleted
+    in its own transaction. A failing kind is rescheduled with exponential backoff.
+    """
+    done = 0
+    async with session_factory() as session:
+        while True:
+            batch = await _claim(session, batch_size)
+            by_kind: dict[str, list[Row]] = defaultdict(list)
+            for event in batch:
+                by_kind[event.kind].append(event)
+            for kind, events in by_kind.items():
+                if await _handle(session, kind, events):
+                    done += len(events)
+            if len(batch) < batch_size:
+                break
+        await _observe_backlog(session)
+    return done
+
+
+class OutboxWorker:
+    """Drains the outbox in the background: after notify() and every ``poll_seconds``."""
+
+    def __init__(self, poll_seconds: float = OUTBOX_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(session_factory), name="outbox-worker")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Lets a drain in progress finish, for up to ``timeout`` seconds, then stops."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            # wait_for cancelled it; the batch it had claimed is retried once its lease ends.
+            logger.warning("outbox worker did not stop within %.0fs", timeout)
+        finally:
+            self._stopping = False
+
+    async def _run(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                await drain(session_factory)
+            except Exception:
+                # e.g. the database is briefly unavailable; events stay queued.
+                logger.exception("outbox drain failed")
+            if self._stopping:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker = OutboxWorker()
+notify = worker.notify
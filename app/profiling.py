@@ -0,0 +1,161 @@
+import logging
+import os
+import re
+import time
+from collections import Counter, deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from app.metrics import RequestStats, current_request, route_template
+
+# Opt-in: the middleware is always installed but only profiles while the profiler is enabled.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+# A statement shape run this many times in one request is reported as a likely N+1.
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+PROFILES_KEPT = 100
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with literals and expanded IN lists collapsed, for grouping repeats."""
+    shape = _LITERALS.sub("?", statement)
+    shape = _PLACEHOLDER_LISTS.sub("(?, ...)", shape)
+    return " ".join(shape.split())
+
+
+def query_budget(max_statements: int) -> Callable[[F], F]:
+    """Declares how many SQL statements one request to this endpoint may issue."""
+
+    def decorate(endpoint: F) -> F:
+        endpoint.query_budget = max_statements  # type: ignore[attr-defined]
+        return endpoint
+
+    return decorate
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    route: str
+    status: int
+    total_seconds: float
+    db_seconds: float
+    render_seconds: float
+    statements: list[tuple[str, float]]
+    budget: int | None = None
+    repeated: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and len(self.statements) > self.budget
+
+    def summary(self) -> str:
+        return (
+            f"{self.method} {self.route} {self.status} {self.total_seconds * 1000:.1f}ms "
+            f"db={len(self.statements)}/{self.db_seconds * 1000:.1f}ms render={self.render_seconds * 1000:.1f}ms"
+        )
+
+
+class Profiler:
+    """Per-request SQL profiles: statement counts and times, repeated shapes and budgets.
+
+    The last ``keep`` profiles stay in ``recent``; the last ``keep`` requests that exceeded
+    their ``@query_budget`` also stay in ``violations`` so tests can fail on them.
+    """
+
+    def __init__(
+        self, enabled: bool = PROFILE_REQUESTS, threshold: int = N_PLUS_ONE_THRESHOLD, keep: int = PROFILES_KEPT
+    ) -> None:
+        self.enabled = enabled
+        self.threshold = threshold
+        self.recent: deque[RequestProfile] = deque(maxlen=keep)
+        self.violations: deque[RequestProfile] = deque(maxlen=keep)
+
+    def record(self, profile: RequestProfile) -> None:
+        shapes = Counter(statement_shape(statement) for statement, _ in profile.statements)
+        profile.repeated = {shape: count for shape, count in shapes.items() if count >= self.threshold}
+        self.recent.append(profile)
+        logger.info(profile.summary())
+        for shape, count in profile.repeated.items():
+            logger.warning("possible N+1 in %s %s: %d x %s", profile.method, profile.route, count, shape)
+        if profile.over_budget:
+            self.violations.append(profile)
+            logger.warning(
+                "%s %s ran %d SQL statements, over its budget of %d",
+                profile.method,
+                profile.route,
+                len(profile.statements),
+                profile.budget,
+            )
+
+
+profiler = Profiler()
+
+
+def _server_timing(stats: RequestStats, total: float) -> bytes:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} queries", '
+        f"render;dur={stats.render_seconds * 1000:.2f}, total;dur={total * 1000:.2f}"
+    ).encode()
+
+
+class ProfilerMiddleware:
+    """Profiles each request while ``profiler.enabled`` and adds a ``Server-Timing`` header.
+
+    The header is sent with the status line, so for streamed pages it covers the work done
+    before the first byte; the recorded profile covers the whole response.
+    """
+
+    def __init__(self, app, profiler: Profiler = profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        # Reuse the metrics middleware's stats when it runs outside this one.
+        stats = current_request.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request.set(stats)
+        stats.statement_log = []
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_timing(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = _server_timing(stats, time.perf_counter() - started)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                current_request.reset(token)
+            endpoint = getattr(scope.get("route"), "endpoint", None)
+            self.profiler.record(
+                RequestProfile(
+                    method=scope["method"],
+                    route=route_template(scope),
+                    status=status,
+                    total_seconds=time.perf_counter() - started,
+                    db_seconds=stats.db_seconds,
+                    render_seconds=stats.render_seconds,
+                    statements=stats.statement_log,
+                    budget=getattr(endpoint, "query_budget", None),
+                )
+            )
+            stats.statement_log = None
@@ -0,0 +1,95 @@
+import csv
+import io
+from collections.abc import AsyncIterator, Callable, Sequence
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+POST_FIELDS = ("id", "authorId", "title", "content", "favoriteCount", "commentCount", "createdAt", "updatedAt")
+USER_FIELDS = ("id", "email", "login", "createdAt", "updatedAt")
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def post_record(row) -> dict[str, Any]:
+    return {
+        "authorId": row.author_id,
+        "title": row.title,
+        "content": row.content,
+        "id": row.id,
+        "favoriteCount": row.favorite_count,
+        "commentCount": row.comment_count,
+        "createdAt": row.created_at,
+        "updatedAt": row.updated_at,
+    }
+
+
+def user_record(row) -> dict[str, Any]:
+    return {
+        "email": row.email,
+        "login": row.login,
+        "id": row.id,
+        "createdAt": row.created_at,
+        "updatedAt": row.updated_at,
+    }
+
+
+async def ndjson_lines(
+    chunks: AsyncIterator[Sequence[Row]], serialize: Callable[[Row], dict[str, Any]]
+) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield b"".join(orjson.dumps(serialize(row)) + b"\n" for row in rows)
+
+
+async def csv_lines(
+    chunks: AsyncIterator[Sequence[Row]], serialize: Callable[[Row], dict[str, Any]], fields: Sequence[str]
+) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    async for rows in chunks:
+        for row in rows:
+            record = serialize(row)
+            writer.writerow({k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()})
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_response(
+    session: AsyncSession,
+    body: AsyncIterator[bytes],
+    media_type: str,
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    # Dependencies with yield are torn down before a streaming body is sent, so the
+    # request session has already been closed here. A closed AsyncSession reconnects on
+    # use; the body owns that connection and must close the session itself.
+    async def guarded() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await session.close()
+
+    return StreamingResponse(guarded(), media_type=media_type, headers=headers)
+
+
+def ndjson_response(
+    session: AsyncSession,
+    chunks: AsyncIterator[Sequence[Row]],
+    serialize: Callable[[Row], dict[str, Any]],
+) -> StreamingResponse:
+    return stream_response(session, ndjson_lines(chunks, serialize), NDJSON_MEDIA_TYPE)
@@ -1,12 +1,7 @@
 from datetime import timedelta
 
-# We need to get templates from main or redefine.
-# Redefining for modularity, but ideally should share instance.
-from pathlib import Path
-
 from fastapi import APIRouter, Depends, Form, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import storage
@@ -15,18 +10,17 @@ from app.models import UserCreate
 from app.security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
-    verify_password,
+    hashing,
 )
-
-TEMPLATES_DIR = Path(__file__).resolve().parents[1] / "templates"
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+from app.templating import render_template
+from app.throttle import login_throttle, retry_after_header
 
 router = APIRouter(tags=["auth"])
 
 
 @router.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request})
+    return await render_template("register.html", {"request": request})
 
 
 @router.post("/register", response_class=HTMLResponse)
@@ -43,7 +37,7 @@ async def register(
         # Auto login or redirect to login? Redirect to login is simpler.
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     except ValueError as e:
-        return templates.TemplateResponse(
+        return await render_template(
             "register.html",
             {"request": request, "error": str(e)},
             status_code=400,
@@ -52,7 +46,7 @@ async def register(
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return await render_template("login.html", {"request": request})
 
 
 @router.post("/login", response_class=HTMLResponse)
@@ -60,16 +54,32 @@ async def login(
     request: Request,
     login: str = Form(...),  # can be email or login
     password: str = Form(...),
+    # The primary, not a replica: a just-registered user or a just-changed password must
+    # be seen, and a lagging read would also count against the throttle.
     db: AsyncSession = Depends(get_db),
 ):
+    # Throttled attempts are turned away before the user lookup and bcrypt.
+    ip = request.client.host if request.client else "unknown"
+    wait = await login_throttle.check(ip, login)
+    if wait:
+        return PlainTextResponse(
+            "Too many login attempts, try again later",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": retry_after_header(wait)},
+        )
+
     user = await storage.get_user_by_login_or_email(db, login)
-    if not user or not verify_password(password, user.password_hash):
-        return templates.TemplateResponse(
+    # Hand the connection back before bcrypt; production has a single writer connection.
+    await db.close()
+    if not user or not await hashing.verify(password, user.password_hash):
+        await login_throttle.failed(ip, login)
+        return await render_template(
             "login.html",
             {"request": request, "error": "Invalid credentials"},
             status_code=400,
         )
 
+    await login_throttle.succeeded(ip, login)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires)
 
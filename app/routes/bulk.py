@@ -0,0 +1,55 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db, get_read_db
+
+from .. import bulk, storage
+from ..responses import (
+    CSV_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    POST_FIELDS,
+    USER_FIELDS,
+    csv_lines,
+    ndjson_lines,
+    post_record,
+    stream_response,
+    user_record,
+)
+
+router = APIRouter(prefix="/bulk", tags=["bulk"])
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def _export(db: AsyncSession, name: str, chunks, serialize, fields, format: ExportFormat) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    if format == "csv":
+        return stream_response(db, csv_lines(chunks, serialize, fields), CSV_MEDIA_TYPE, headers)
+    return stream_response(db, ndjson_lines(chunks, serialize), NDJSON_MEDIA_TYPE, headers)
+
+
+@router.post("/posts")
+async def import_posts(request: Request, db: AsyncSession = Depends(get_db)) -> dict:
+    """Imports posts from an NDJSON body, one PostCreate object per line."""
+    report = await bulk.import_posts(db, bulk.iter_lines(request.stream()))
+    return report.as_dict()
+
+
+@router.post("/users")
+async def import_users(request: Request, db: AsyncSession = Depends(get_db)) -> dict:
+    """Imports users from an NDJSON body, one UserCreate object per line."""
+    report = await bulk.import_users(db, bulk.iter_lines(request.stream()))
+    return report.as_dict()
+
+
+@router.get("/posts")
+async def export_posts(format: ExportFormat = "ndjson", db: AsyncSession = Depends(get_read_db)) -> StreamingResponse:
+    return _export(db, "posts", storage.stream_posts(db), post_record, POST_FIELDS, format)
+
+
+@router.get("/users")
+async def export_users(format: ExportFormat = "ndjson", db: AsyncSession = Depends(get_read_db)) -> StreamingResponse:
+    return _export(db, "users", storage.stream_users(db), user_record, USER_FIELDS, format)
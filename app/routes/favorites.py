@@ -20,12 +20,10 @@ async def add_to_favorites(
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
-    # Verify post exists
-    post = await storage.get_post(db, post_id)
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    await storage.add_favorite(db, user.id, post_id)
+    try:
+        await storage.add_favorite(db, user.id, post_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail="Post not found") from e
 
     # Redirect back to referer or post detail
     referer = request.headers.get("referer")
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from app import storage
+from app.database import get_db, get_read_db
+from app.deps import get_current_user
+from app.models import User
+from app.profiling import query_budget
+from app.templating import StreamingTemplateResponse
+
+router = APIRouter(tags=["follows"])
+
+
+def _back(request: Request, fallback: str) -> RedirectResponse:
+    referer = request.headers.get("referer")
+    return RedirectResponse(url=referer or fallback, status_code=status.HTTP_303_SEE_OTHER)
+
+
+@router.post("/follow/{user_id}", response_class=RedirectResponse)
+async def follow(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+    try:
+        await storage.follow_user(db, user.id, user_id)
+    except ValueError as e:
+        code = 404 if "not found" in str(e) else 400
+        raise HTTPException(status_code=code, detail=str(e)) from e
+    return _back(request, "/feed")
+
+
+@router.post("/unfollow/{user_id}", response_class=RedirectResponse)
+async def unfollow(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+
+    await storage.unfollow_user(db, user.id, user_id)
+    return _back(request, "/feed")
+
+
+@router.get("/feed", response_class=HTMLResponse)
+@query_budget(3)
+async def feed_page(
+    request: Request,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User | None = Depends(get_current_user),
+):
+    if not user:
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    try:
+        if cursor is not None:
+            storage.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    async def feed_chunks():
+        page = await storage.list_feed(db, user.id, cursor=cursor)
+        posts.next_cursor = page.next_cursor
+        yield page.items
+
+    posts = storage.PostListing(db, feed_chunks())
+    return StreamingTemplateResponse(
+        "feed.html",
+        {"request": request, "posts": posts, "user": user},
+        background=BackgroundTask(db.close),
+    )
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 
 from .. import storage
-from ..models import Post, PostCreate, PostUpdate
+from ..conditional import is_not_modified, make_etag, not_modified, validator_headers
+from ..models import Comment, CommentCreate, CommentPage, Post, PostCreate, PostPage, PostUpdate, normalize_tags
+from ..profiling import query_budget
+from ..responses import ndjson_response, post_record, wants_ndjson
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
@@ -17,19 +20,58 @@ async def create_post(post_in: PostCreate, db: AsyncSession = Depends(get_db)) -
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@router.get("/", response_model=list[Post])
+@router.get("/", response_model=PostPage)
+@query_budget(1)
 async def list_posts(
-    authorId: int | None = Query(default=None, alias="authorId"), db: AsyncSession = Depends(get_db)
+    request: Request,
+    authorId: int | None = Query(default=None, alias="authorId"),
+    tag: list[str] = Query(default=[]),
+    cursor: str | None = None,
+    limit: int = Query(default=storage.POSTS_PAGE_SIZE, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+) -> PostPage | Response:
+    # Repeating ?tag= narrows the listing to posts that carry all of them.
+    try:
+        tags = normalize_tags(tag)
+        if wants_ndjson(request):
+            # Streams every matching post after the cursor; limit does not apply. A bad
+            # cursor has to be rejected here, before the 200 status line goes out.
+            if cursor is not None:
+                storage.decode_cursor(cursor)
+            chunks = storage.stream_posts(db, author_id=authorId, cursor=cursor, tags=tags)
+            return ndjson_response(db, chunks, post_record)
+        page = await storage.list_posts(db, author_id=authorId, cursor=cursor, limit=limit, tags=tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return PostPage.model_validate(page)
+
+
+@router.get("/popular", response_model=list[Post])
+@query_budget(1)
+async def most_favorited(
+    limit: int = Query(default=storage.POPULAR_PAGE_SIZE, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[Post]:
-    # TODO: Update storage.list_posts to support filtering
-    return await storage.list_posts(db)
+    return await storage.list_most_favorited(db, limit)
 
 
 @router.get("/{post_id}", response_model=Post)
-async def get_post(post_id: int, db: AsyncSession = Depends(get_db)) -> Post:
+@query_budget(2)
+async def get_post(
+    post_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)
+) -> Post | Response:
+    # Answer revalidations from updated_at alone before loading the full row.
+    updated_at = await storage.get_post_version(db, post_id)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="post not found")
+    etag = make_etag("post", post_id, updated_at.isoformat())
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(validator_headers(etag, updated_at))
+
     post = await storage.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="post not found")
+    response.headers.update(validator_headers(make_etag("post", post_id, post.updated_at.isoformat()), post.updated_at))
     return post
 
 
@@ -42,4 +84,36 @@ async def update_post(post_id: int, post_in: PostUpdate, db: AsyncSession = Depe
     return post
 
 
+def _comment(comment, logins: dict[int, str]) -> Comment:
+    return Comment.model_validate(comment).model_copy(update={"author_login": logins.get(comment.author_id)})
+
+
+@router.post("/{post_id}/comments", response_model=Comment, status_code=status.HTTP_201_CREATED)
+async def create_comment(post_id: int, comment_in: CommentCreate, db: AsyncSession = Depends(get_db)) -> Comment:
+    try:
+        created = await storage.create_comment(db, post_id, comment_in)
+    except ValueError as e:
+        code = 404 if "not found" in str(e) else 400
+        raise HTTPException(status_code=code, detail=str(e)) from e
+    return _comment(created, await storage.get_user_logins(db, [created.author_id]))
+
+
+@router.get("/{post_id}/comments", response_model=CommentPage)
+@query_budget(3)
+async def list_comments(
+    post_id: int,
+    cursor: str | None = None,
+    limit: int = Query(default=storage.COMMENTS_PAGE_SIZE, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
+) -> CommentPage:
+    try:
+        page = await storage.list_comments(db, post_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    # Only an empty first page needs to tell "no comments" from "no post".
+    if not page.items and cursor is None and await storage.get_post_version(db, post_id) is None:
+        raise HTTPException(status_code=404, detail="post not found")
+    return CommentPage(items=[_comment(c, page.logins) for c in page.items], next_cursor=page.next_cursor)
+
+
 # TODO: Add delete_post to storage.py
@@ -1,41 +1,60 @@
-from pathlib import Path
-
-from fastapi import APIRouter, Depends, Form, Request, status
+from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
 from app import storage
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.deps import get_current_user
 from app.models import User, UserUpdate
-
-TEMPLATES_DIR = Path(__file__).resolve().parents[1] / "templates"
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+from app.profiling import query_budget
+from app.templating import StreamingTemplateResponse
 
 router = APIRouter(tags=["profile"])
 
 
+async def render_profile(
+    request: Request,
+    db: AsyncSession,
+    user: User,
+    cursor: str | None = None,
+    status_code: int = 200,
+    **extra,
+) -> StreamingTemplateResponse:
+    if cursor is not None:
+        storage.decode_cursor(cursor)
+
+    # Both lists are queried while the page streams, after the header has been sent.
+    chunks = storage.stream_posts(db, author_id=user.id, cursor=cursor, limit=storage.POSTS_PAGE_SIZE + 1)
+    my_posts = storage.PostListing(db, chunks, limit=storage.POSTS_PAGE_SIZE)
+
+    async def my_favorites():
+        for post in await storage.list_favorites(db, user.id):
+            yield post
+
+    return StreamingTemplateResponse(
+        "profile.html",
+        {"request": request, "user": user, "my_posts": my_posts, "my_favorites": my_favorites(), **extra},
+        status_code=status_code,
+        background=BackgroundTask(db.close),
+    )
+
+
 @router.get("/profile", response_class=HTMLResponse)
+@query_budget(3)
 async def profile_page(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
 ):
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
-    # Fetch user's posts
-    all_posts = await storage.list_posts(db)
-    my_posts = [p for p in all_posts if p.author_id == user.id]
-
-    # Fetch user's favorites
-    my_favorites = await storage.list_favorites(db, user.id)
-
-    return templates.TemplateResponse(
-        "profile.html",
-        {"request": request, "user": user, "my_posts": my_posts, "my_favorites": my_favorites},
-    )
+    try:
+        return await render_profile(request, db, user, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 @router.post("/profile", response_class=HTMLResponse)
@@ -45,6 +64,7 @@ async def update_profile(
     login: str = Form(...),
     password: str = Form(None),
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
     user: User | None = Depends(get_current_user),
 ):
     if not user:
@@ -55,37 +75,14 @@ async def update_profile(
         if password:
             update_data.password = password
 
-        updated_user = await storage.update_user(db, user.id, update_data)
-
-        # Re-fetch posts for template
-        all_posts = await storage.list_posts(db)
-        my_posts = [p for p in all_posts if p.author_id == updated_user.id]
-
-        # Fetch user's favorites
-        my_favorites = await storage.list_favorites(db, updated_user.id)
-
-        return templates.TemplateResponse(
-            "profile.html",
-            {
-                "request": request,
-                "user": updated_user,
-                "my_posts": my_posts,
-                "my_favorites": my_favorites,
-                "success": "Profile updated successfully!",
-            },
-        )
+        updated_user = User.model_validate(await storage.update_user(db, user.id, update_data))
     except ValueError as e:
-        all_posts = await storage.list_posts(db)
-        my_posts = [p for p in all_posts if p.author_id == user.id]
-        my_favorites = await storage.list_favorites(db, user.id)
-        return templates.TemplateResponse(
-            "profile.html",
-            {
-                "request": request,
-                "user": user,
-                "my_posts": my_posts,
-                "my_favorites": my_favorites,
-                "error": str(e),
-            },
-            status_code=400,
-        )
+        updated_user, outcome = None, {"status_code": 400, "error": str(e)}
+    else:
+        outcome = {"success": "Profile updated successfully!"}
+    finally:
+        # The page streams for as long as the client takes to read it; the write connection
+        # (the only one in the production profile) must not be held for that.
+        await db.close()
+
+    return await render_profile(request, read_db, updated_user or user, **outcome)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from app import storage
+from app.database import get_read_db
+from app.deps import get_current_user
+from app.models import TagCount, User
+from app.profiling import query_budget
+from app.templating import StreamingTemplateResponse
+
+router = APIRouter(tags=["tags"])
+
+
+@router.get("/tags/", response_model=list[TagCount])
+@query_budget(1)
+async def tag_cloud(
+    limit: int = Query(default=storage.TAG_CLOUD_SIZE, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
+) -> list[TagCount]:
+    return await storage.tag_cloud(db, limit)
+
+
+@router.get("/html/tags/{name}", response_class=HTMLResponse)
+@query_budget(3)
+async def tag_page(
+    name: str,
+    request: Request,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User | None = Depends(get_current_user),
+):
+    try:
+        if cursor is not None:
+            storage.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    tag = name.strip().lower()
+    chunks = storage.stream_posts(db, cursor=cursor, limit=storage.POSTS_PAGE_SIZE + 1, tags=[tag])
+    posts = storage.PostListing(db, chunks, limit=storage.POSTS_PAGE_SIZE)
+    return StreamingTemplateResponse(
+        "tag.html",
+        {"request": request, "posts": posts, "user": user, "tag": tag},
+        background=BackgroundTask(db.close),
+    )
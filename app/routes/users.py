@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 
 from .. import storage
+from ..conditional import is_not_modified, make_etag, not_modified, validator_headers
 from ..models import User, UserCreate, UserUpdate
+from ..responses import ndjson_response, user_record, wants_ndjson
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -18,15 +20,27 @@ async def create_user(user_in: UserCreate, db: AsyncSession = Depends(get_db)) -
 
 
 @router.get("/", response_model=list[User])
-async def list_users(db: AsyncSession = Depends(get_db)) -> list[User]:
+async def list_users(request: Request, db: AsyncSession = Depends(get_read_db)) -> list[User] | Response:
+    if wants_ndjson(request):
+        return ndjson_response(db, storage.stream_users(db), user_record)
     return await storage.list_users(db)
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)) -> User:
+async def get_user(
+    user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)
+) -> User | Response:
+    updated_at = await storage.get_user_version(db, user_id)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="user not found")
+    etag = make_etag("user", user_id, updated_at.isoformat())
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(validator_headers(etag, updated_at))
+
     user = await storage.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
+    response.headers.update(validator_headers(make_etag("user", user_id, user.updated_at.isoformat()), user.updated_at))
     return user
 
 
@@ -0,0 +1,199 @@
+import base64
+import binascii
+from typing import NamedTuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, func, literal_column, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import tables
+
+SEARCH_PAGE_SIZE = 20
+
+# snippet()/ts_headline() wrap matches in these control characters, which HTML escaping
+# leaves alone; they are stripped from everything indexed or highlighted, so after
+# escaping any left in a snippet are ours and can be swapped for <mark>.
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+_STRIP_MARKS = str.maketrans("", "", _MARK_START + _MARK_END)
+# Control characters in a query are word breaks; a NUL would otherwise end the FTS5
+# query string early ("unterminated string").
+_QUERY_CONTROLS = dict.fromkeys([*range(0x20), 0x7F], " ")
+
+# SQLite: a standalone FTS5 table whose rowid is the post id, maintained by index_post().
+# Postgres: a GIN expression index, kept current by the database itself. The expression
+# must match _pg_vector() exactly for the planner to use the index.
+SQLITE_FTS_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, tokenize='unicode61')"
+SQLITE_FTS_DROP = "DROP TABLE IF EXISTS posts_fts"
+POSTGRES_FTS_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_posts_search ON posts USING GIN (to_tsvector('simple', title || ' ' || content))"
+)
+POSTGRES_FTS_DROP = "DROP INDEX IF EXISTS ix_posts_search"
+
+event.listen(tables.Post.__table__, "after_create", DDL(SQLITE_FTS_DDL).execute_if(dialect="sqlite"))
+event.listen(tables.Post.__table__, "before_drop", DDL(SQLITE_FTS_DROP).execute_if(dialect="sqlite"))
+event.listen(tables.Post.__table__, "after_create", DDL(POSTGRES_FTS_DDL).execute_if(dialect="postgresql"))
+
+_fts = literal_column("posts_fts")
+_fts_rowid = literal_column("posts_fts.rowid")
+
+
+class SearchPage(NamedTuple):
+    items: list[tables.Post]
+    next_cursor: str | None
+    snippets: dict[int, Markup]
+
+
+def _dialect(session: AsyncSession) -> str:
+    return session.get_bind().dialect.name
+
+
+def _terms(query: str) -> list[str]:
+    return query.translate(_QUERY_CONTROLS).split()
+
+
+def _indexed(post: dict) -> dict:
+    return {**post, "title": post["title"].translate(_STRIP_MARKS), "content": post["content"].translate(_STRIP_MARKS)}
+
+
+def _without_marks(column):
+    return func.replace(func.replace(column, _MARK_START, ""), _MARK_END, "")
+
+
+def _sqlite_match(terms: list[str]) -> str:
+    # Quote every term so user input can never be parsed as FTS5 syntax; the trailing
+    # * keeps prefix matching close to the old substring behaviour.
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+def _pg_tsquery(terms: list[str]) -> str:
+    return " & ".join("'" + t.replace("\\", "\\\\").replace("'", "''") + "':*" for t in terms)
+
+
+def _pg_vector():
+    return func.to_tsvector(
+        literal_column("'simple'"), tables.Post.title.op("||")(literal_column("' '")).op("||")(tables.Post.content)
+    )
+
+
+def _highlight(raw: str | None) -> Markup:
+    return Markup(str(escape(raw or "")).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>"))
+
+
+def encode_cursor(score: float, post_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{score!r}:{post_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, post_id = raw.split(":")
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+async def index_post(session: AsyncSession, post: tables.Post) -> None:
+    if _dialect(session) != "sqlite":
+        return
+    await session.execute(text("DELETE FROM posts_fts WHERE rowid = :id"), {"id": post.id})
+    await session.execute(
+        text("INSERT INTO posts_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+        _indexed({"id": post.id, "title": post.title, "content": post.content}),
+    )
+
+
+async def index_new_posts(session: AsyncSession, posts: list[dict]) -> None:
+    # Bulk variant for freshly inserted rows: one executemany, no stale entries to delete.
+    if _dialect(session) != "sqlite" or not posts:
+        return
+    await session.execute(
+        text("INSERT INTO posts_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+        [_indexed(post) for post in posts],
+    )
+
+
+async def rebuild_index(session: AsyncSession) -> int:
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        await session.execute(text(SQLITE_FTS_DDL))
+        await session.execute(text("DELETE FROM posts_fts"))
+        result = await session.execute(
+            text(
+                "INSERT INTO posts_fts (rowid, title, content) SELECT id, "
+                "replace(replace(title, char(2), ''), char(3), ''), "
+                "replace(replace(content, char(2), ''), char(3), '') FROM posts"
+            )
+        )
+    elif dialect == "postgresql":
+        await session.execute(text(POSTGRES_FTS_DDL))
+        await session.execute(text("REINDEX INDEX ix_posts_search"))
+        result = await session.execute(text("SELECT count(*) FROM posts"))
+        await session.commit()
+        return int(result.scalar_one())
+    else:
+        raise ValueError(f"full-text search is not supported on {dialect}")
+    await session.commit()
+    return result.rowcount
+
+
+async def search_posts(
+    session: AsyncSession,
+    query: str,
+    *,
+    cursor: str | None = None,
+    limit: int = SEARCH_PAGE_SIZE,
+) -> SearchPage:
+    terms = _terms(query)
+    if not terms:
+        return SearchPage([], None, {})
+
+    dialect = _dialect(session)
+    if dialect == "sqlite":
+        # Lower bm25 is better; title hits weigh more than body hits.
+        match = _sqlite_match(terms)
+        score = func.bm25(_fts, 10.0, 1.0).label("score")
+        ranked = select(_fts_rowid.label("id"), score).select_from(text("posts_fts")).where(_fts.match(match))
+    elif dialect == "postgresql":
+        tsquery = func.to_tsquery(literal_column("'simple'"), _pg_tsquery(terms))
+        score = (-func.ts_rank(_pg_vector(), tsquery)).label("score")
+        ranked = select(tables.Post.id.label("id"), score).where(_pg_vector().op("@@")(tsquery))
+    else:
+        raise ValueError(f"full-text search is not supported on {dialect}")
+
+    # Rank first and only touch the winning page: snippets and full rows are fetched
+    # for at most `limit` posts, however many documents match.
+    ranked_sq = ranked.subquery()
+    page_stmt = select(ranked_sq.c.id, ranked_sq.c.score).order_by(ranked_sq.c.score, ranked_sq.c.id)
+    if cursor is not None:
+        after_score, after_id = decode_cursor(cursor)
+        page_stmt = page_stmt.where(tuple_(ranked_sq.c.score, ranked_sq.c.id) > tuple_(after_score, after_id))
+    rows = (await session.execute(page_stmt.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+    ids = [row.id for row in rows]
+    if not ids:
+        return SearchPage([], None, {})
+
+    if dialect == "sqlite":
+        snippet = func.snippet(_fts, 1, _MARK_START, _MARK_END, "…", 24)
+        snippet_stmt = (
+            select(_fts_rowid.label("id"), snippet.label("snippet"))
+            .select_from(text("posts_fts"))
+            .where(_fts.match(match), _fts_rowid.in_(ids))
+        )
+    else:
+        snippet = func.ts_headline(
+            literal_column("'simple'"),
+            _without_marks(tables.Post.content),
+            tsquery,
+            f'StartSel="{_MARK_START}", StopSel="{_MARK_END}", MaxWords=35, MinWords=15',
+        )
+        snippet_stmt = select(tables.Post.id.label("id"), snippet.label("snippet")).where(tables.Post.id.in_(ids))
+    snippets = {row.id: _highlight(row.snippet) for row in await session.execute(snippet_stmt)}
+
+    posts = {p.id: p for p in (await session.execute(select(tables.Post).where(tables.Post.id.in_(ids)))).scalars()}
+    return SearchPage([posts[i] for i in ids if i in posts], next_cursor, snippets)
@@ -1,26 +1,90 @@
-from sqlalchemy import delete, or_, select
+import base64
+import binascii
+from collections import Counter
+from collections.abc import AsyncIterator, Iterable, Sequence
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import Row, bindparam, delete, func, insert, literal, or_, select, tuple_, union, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import tables
-from app.models import PostCreate, PostUpdate, UserCreate, UserUpdate
-from app.security import get_password_hash
+from app import outbox, search, tables
+from app.cache import page_cache, user_cache
+from app.database import read_router
+from app.models import CommentCreate, PostCreate, PostUpdate, UserCreate, UserUpdate
+from app.security import hashing
+
+POSTS_PAGE_SIZE = 20
+POPULAR_PAGE_SIZE = 20
+TAG_CLOUD_SIZE = 50
+FEED_PAGE_SIZE = 20
+COMMENTS_PAGE_SIZE = 50
+# Accounts with this many followers stop fanning out on write (see follow_user).
+FANOUT_FOLLOWER_LIMIT = 1000
+# How many of a followee's recent posts are copied into the timeline on follow.
+FEED_BACKFILL_SIZE = 50
+STREAM_CHUNK_SIZE = 500
+# Outbox event carrying {"post_ids": [...]} to push into followers' timelines.
+FAN_OUT_EVENT = "feed.fan_out"
+
+
+class PostPage(NamedTuple):
+    items: list[tables.Post]
+    next_cursor: str | None
+
+
+class CommentPage(NamedTuple):
+    items: list[tables.Comment]
+    next_cursor: str | None
+    logins: dict[int, str]
+
+
+def _insert(session: AsyncSession, entity):
+    # ON CONFLICT DO NOTHING needs the dialect's own INSERT construct.
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(entity)
+    return sqlite.insert(entity)
+
+
+def _violates(error: IntegrityError, column: str) -> bool:
+    # SQLite: "UNIQUE constraint failed: users.email"; Postgres: "Key (email)=(...) already exists".
+    message = str(error.orig)
+    return f".{column}" in message or f"({column})=" in message
+
+
+def encode_cursor(post_id: int) -> str:
+    return base64.urlsafe_b64encode(str(post_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
 
 
 async def create_user(session: AsyncSession, payload: UserCreate) -> tables.User:
-    stmt = select(tables.User).where((tables.User.email == payload.email) | (tables.User.login == payload.login))
-    result = await session.execute(stmt)
-    if result.scalars().first():
+    # A cheap lookup first, so a duplicate doesn't cost a bcrypt hash; the unique
+    # constraints still settle a race with a concurrent registration.
+    taken = select(tables.User.id).where(or_(tables.User.email == payload.email, tables.User.login == payload.login))
+    if (await session.execute(taken.limit(1))).first() is not None:
+        await session.rollback()
         raise ValueError("email or login already exists")
-
-    hashed_pw = get_password_hash(payload.password)
-    user = tables.User(
-        email=payload.email,
-        login=payload.login,
-        password_hash=hashed_pw,
+    hashed_pw = await hashing.hash(payload.password)
+    stmt = (
+        _insert(session, tables.User)
+        .values(email=payload.email, login=payload.login, password_hash=hashed_pw)
+        .on_conflict_do_nothing()
+        .returning(tables.User)
     )
-    session.add(user)
+    user = (await session.execute(stmt)).scalar_one_or_none()
+    if user is None:
+        await session.rollback()
+        raise ValueError("email or login already exists")
     await session.commit()
-    await session.refresh(user)
     return user
 
 
@@ -28,56 +92,97 @@ async def get_user(session: AsyncSession, user_id: int) -> tables.User | None:
     return await session.get(tables.User, user_id)
 
 
+async def get_user_version(session: AsyncSession, user_id: int) -> datetime | None:
+    stmt = select(tables.User.updated_at).where(tables.User.id == user_id)
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
 async def get_user_by_login_or_email(session: AsyncSession, login_str: str) -> tables.User | None:
     stmt = select(tables.User).where(or_(tables.User.email == login_str, tables.User.login == login_str))
     result = await session.execute(stmt)
     return result.scalars().first()
 
 
+async def get_user_logins(session: AsyncSession, user_ids: Iterable[int]) -> dict[int, str]:
+    ids = set(user_ids)
+    if not ids:
+        return {}
+    stmt = select(tables.User.id, tables.User.login).where(tables.User.id.in_(ids))
+    result = await session.execute(stmt)
+    return {row.id: row.login for row in result}
+
+
 async def list_users(session: AsyncSession) -> list[tables.User]:
     stmt = select(tables.User).order_by(tables.User.id)
     result = await session.execute(stmt)
     return list(result.scalars().all())
 
 
-async def update_user(session: AsyncSession, user_id: int, payload: UserUpdate) -> tables.User:
-    user = await get_user(session, user_id)
-    if not user:
-        raise ValueError("user not found")
+async def stream_users(session: AsyncSession) -> AsyncIterator[Sequence[Row]]:
+    user = tables.User
+    stmt = select(user.id, user.email, user.login, user.created_at, user.updated_at).order_by(user.id)
+    result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    async for rows in result.partitions():
+        yield rows
 
-    if payload.email is not None:
-        stmt = select(tables.User).where(tables.User.email == payload.email, tables.User.id != user_id)
-        if (await session.execute(stmt)).scalars().first():
-            raise ValueError("email already exists")
-        user.email = payload.email
 
+async def update_user(session: AsyncSession, user_id: int, payload: UserUpdate) -> tables.User:
+    changes: dict[str, Any] = {}
+    if payload.email is not None:
+        changes["email"] = payload.email
     if payload.login is not None:
-        stmt = select(tables.User).where(tables.User.login == payload.login, tables.User.id != user_id)
-        if (await session.execute(stmt)).scalars().first():
-            raise ValueError("login already exists")
-        user.login = payload.login
-
+        changes["login"] = payload.login
     if payload.password is not None:
-        user.password_hash = get_password_hash(payload.password)
+        changes["password_hash"] = await hashing.hash(payload.password)
+
+    if not changes:
+        user = await get_user(session, user_id)
+        if not user:
+            raise ValueError("user not found")
+        return user
+
+    stmt = update(tables.User).where(tables.User.id == user_id).values(**changes).returning(tables.User)
+    try:
+        user = (await session.execute(stmt)).scalar_one_or_none()
+    except IntegrityError as e:
+        await session.rollback()
+        if _violates(e, "email"):
+            raise ValueError("email already exists") from e
+        if _violates(e, "login"):
+            raise ValueError("login already exists") from e
+        raise
+    if user is None:
+        await session.rollback()
+        raise ValueError("user not found")
 
     await session.commit()
-    await session.refresh(user)
+    read_router.note_write(user_id)
+    user_cache.invalidate_user(user_id)
+    page_cache.invalidate(f"user:{user_id}")
     return user
 
 
 async def create_post(session: AsyncSession, payload: PostCreate) -> tables.Post:
-    author = await get_user(session, payload.author_id)
-    if not author:
-        raise ValueError("author does not exist")
-
-    post = tables.Post(
-        author_id=payload.author_id,
-        title=payload.title,
-        content=payload.content,
+    # The author check is the foreign key; no need to load the author row first.
+    stmt = (
+        insert(tables.Post)
+        .values(author_id=payload.author_id, title=payload.title, content=payload.content)
+        .returning(tables.Post)
     )
-    session.add(post)
+    try:
+        post = (await session.execute(stmt)).scalar_one()
+    except IntegrityError as e:
+        await session.rollback()
+        raise ValueError("author does not exist") from e
+
+    await search.index_new_posts(session, [{"id": post.id, "title": post.title, "content": post.content}])
+    if payload.tags:
+        await link_tags(session, {post.id: payload.tags})
+    await outbox.enqueue(session, FAN_OUT_EVENT, [{"post_ids": [post.id]}])
     await session.commit()
-    await session.refresh(post)
+    outbox.notify()
+    read_router.note_write(payload.author_id)
+    page_cache.invalidate("posts", "search")
     return post
 
 
@@ -85,50 +190,216 @@ async def get_post(session: AsyncSession, post_id: int) -> tables.Post | None:
     return await session.get(tables.Post, post_id)
 
 
-async def list_posts(session: AsyncSession, search_query: str | None = None) -> list[tables.Post]:
-    stmt = select(tables.Post).order_by(tables.Post.created_at.desc())
+async def get_post_with_author(session: AsyncSession, post_id: int) -> tuple[tables.Post, tables.User] | None:
+    stmt = (
+        select(tables.Post, tables.User)
+        .join(tables.User, tables.User.id == tables.Post.author_id)
+        .where(tables.Post.id == post_id)
+    )
+    row = (await session.execute(stmt)).first()
+    return None if row is None else (row[0], row[1])
+
+
+async def get_post_version(session: AsyncSession, post_id: int) -> datetime | None:
+    stmt = select(tables.Post.updated_at).where(tables.Post.id == post_id)
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def get_post_page_version(session: AsyncSession, post_id: int) -> tuple[datetime, ...] | None:
+    # The HTML page also shows the logins of the author and of every commenter, so their
+    # rows are part of its version. A post without comments has no commenter timestamp.
+    commenters = (
+        select(func.max(tables.User.updated_at))
+        .select_from(tables.Comment)
+        .join(tables.User, tables.User.id == tables.Comment.author_id)
+        .where(tables.Comment.post_id == post_id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(tables.Post.updated_at, tables.User.updated_at, commenters)
+        .join(tables.User, tables.User.id == tables.Post.author_id)
+        .where(tables.Post.id == post_id)
+    )
+    row = (await session.execute(stmt)).first()
+    return None if row is None else tuple(stamp for stamp in row if stamp is not None)
+
+
+def _tagged_with(tags: Sequence[str]):
+    # Posts carrying every tag: one ix_post_tags_tag_id range per tag, intersected by count.
+    return (
+        select(tables.post_tags.c.post_id)
+        .join(tables.Tag, tables.Tag.id == tables.post_tags.c.tag_id)
+        .where(tables.Tag.name.in_(tags))
+        .group_by(tables.post_tags.c.post_id)
+        .having(func.count() == len(tags))
+    )
+
 
-    if search_query:
-        term = f"%{search_query}%"
-        stmt = stmt.where(or_(tables.Post.title.ilike(term), tables.Post.content.ilike(term)))
+def _posts_query(author_id: int | None, cursor: str | None, tags: Sequence[str] = ()):
+    # Keyset pagination on (created_at, id): the cursor only carries the id of the last
+    # row, and the database resolves its (created_at, id) so the comparison always uses
+    # the stored representation of the timestamp.
+    stmt = select(tables.Post).order_by(tables.Post.created_at.desc(), tables.Post.id.desc())
+
+    if author_id is not None:
+        stmt = stmt.where(tables.Post.author_id == author_id)
+
+    if tags:
+        stmt = stmt.where(tables.Post.id.in_(_tagged_with(tags)))
+
+    if cursor is not None:
+        anchor = (
+            select(tables.Post.created_at, tables.Post.id)
+            .where(tables.Post.id == decode_cursor(cursor))
+            .scalar_subquery()
+        )
+        stmt = stmt.where(tuple_(tables.Post.created_at, tables.Post.id) < anchor)
+    return stmt
+
+
+async def list_posts(
+    session: AsyncSession,
+    *,
+    author_id: int | None = None,
+    cursor: str | None = None,
+    limit: int | None = POSTS_PAGE_SIZE,
+    tags: Sequence[str] = (),
+) -> PostPage:
+    stmt = _posts_query(author_id, cursor, tags)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
 
     result = await session.execute(stmt)
-    return list(result.scalars().all())
+    posts = list(result.scalars().all())
+    if limit is None or len(posts) <= limit:
+        return PostPage(posts, None)
+    posts = posts[:limit]
+    return PostPage(posts, encode_cursor(posts[-1].id))
+
+
+async def stream_posts(
+    session: AsyncSession,
+    *,
+    author_id: int | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+    tags: Sequence[str] = (),
+) -> AsyncIterator[Sequence[Row]]:
+    # Plain rows in chunks of STREAM_CHUNK_SIZE from a server-side cursor; nothing is
+    # turned into ORM objects and at most one chunk is held in memory.
+    stmt = _posts_query(author_id, cursor, tags).with_only_columns(*tables.Post.__table__.c)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    async for rows in result.partitions():
+        yield rows
+
+
+class PostListing:
+    """Posts paired with their author's login, pulled chunk by chunk while a template renders.
+
+    Each chunk costs one batched login lookup. With ``limit``, one extra row should be
+    requested from the source; it is not yielded and only sets ``next_cursor``.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        chunks: AsyncIterator[Sequence[Any]],
+        limit: int | None = None,
+        next_cursor: str | None = None,
+    ) -> None:
+        self._session = session
+        self._chunks = chunks
+        self._limit = limit
+        self.next_cursor = next_cursor
+        self.post_ids: list[int] = []
+        self.logins: dict[int, str] = {}
+
+    async def __aiter__(self) -> AsyncIterator[tuple[Any, str]]:
+        try:
+            async for rows in self._chunks:
+                missing = {row.author_id for row in rows} - self.logins.keys()
+                self.logins.update(await get_user_logins(self._session, missing))
+                for row in rows:
+                    if self._limit is not None and len(self.post_ids) == self._limit:
+                        self.next_cursor = encode_cursor(self.post_ids[-1])
+                        return
+                    self.post_ids.append(row.id)
+                    yield row, self.logins.get(row.author_id, "unknown")
+        finally:
+            await self._chunks.aclose()
 
 
 async def update_post(session: AsyncSession, post_id: int, payload: PostUpdate) -> tables.Post:
-    post = await get_post(session, post_id)
-    if not post:
+    changes = payload.model_dump(exclude_none=True, exclude={"tags"})
+    if payload.tags is not None:
+        # Tags show on the post page, so retagging is an edit as far as validators go.
+        changes["updated_at"] = tables.utcnow()
+    if not changes:
+        post = await get_post(session, post_id)
+        if not post:
+            raise ValueError("post not found")
+        return post
+
+    stmt = update(tables.Post).where(tables.Post.id == post_id).values(**changes).returning(tables.Post)
+    post = (await session.execute(stmt)).scalar_one_or_none()
+    if post is None:
+        await session.rollback()
         raise ValueError("post not found")
 
-    if payload.title is not None:
-        post.title = payload.title
-    if payload.content is not None:
-        post.content = payload.content
-
+    if payload.tags is not None:
+        await _retag_post(session, post_id, payload.tags)
+    await search.index_post(session, post)
     await session.commit()
-    await session.refresh(post)
+    # Only the author edits a post.
+    read_router.note_write(post.author_id)
+    page_cache.invalidate(f"post:{post_id}", "search")
     return post
 
 
-async def add_favorite(session: AsyncSession, user_id: int, post_id: int) -> None:
-    stmt = select(tables.Favorite).where(tables.Favorite.user_id == user_id, tables.Favorite.post_id == post_id)
-    if (await session.execute(stmt)).scalars().first():
-        return
+def _bump_favorite_count(post_id: int, delta: int):
+    return (
+        update(tables.Post)
+        .where(tables.Post.id == post_id)
+        .values(favorite_count=tables.Post.favorite_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
 
-    fav = tables.Favorite(user_id=user_id, post_id=post_id)
-    session.add(fav)
+async def add_favorite(session: AsyncSession, user_id: int, post_id: int) -> None:
+    # An existing favorite is a conflict that inserts nothing; a missing post fails the
+    # foreign key. The counter moves in the same transaction and only for a new row.
+    stmt = (
+        _insert(session, tables.Favorite)
+        .values(user_id=user_id, post_id=post_id)
+        .on_conflict_do_nothing()
+        .returning(tables.Favorite.post_id)
+    )
     try:
+        if (await session.execute(stmt)).first() is None:
+            await session.rollback()
+            return
+        await session.execute(_bump_favorite_count(post_id, 1))
         await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise ValueError("post not found") from e
     except Exception:
         await session.rollback()
         raise
+    read_router.note_write(user_id)
+    page_cache.invalidate(f"post:{post_id}")
 
 
 async def remove_favorite(session: AsyncSession, user_id: int, post_id: int) -> None:
     stmt = delete(tables.Favorite).where(tables.Favorite.user_id == user_id, tables.Favorite.post_id == post_id)
-    await session.execute(stmt)
+    result = await session.execute(stmt)
+    if result.rowcount:
+        await session.execute(_bump_favorite_count(post_id, -1))
     await session.commit()
+    read_router.note_write(user_id)
+    page_cache.invalidate(f"post:{post_id}")
 
 
 async def is_favorited(session: AsyncSession, user_id: int, post_id: int) -> bool:
@@ -146,3 +417,321 @@ async def list_favorites(session: AsyncSession, user_id: int) -> list[tables.Pos
     )
     result = await session.execute(stmt)
     return list(result.scalars().all())
+
+
+async def list_most_favorited(session: AsyncSession, limit: int = POPULAR_PAGE_SIZE) -> list[tables.Post]:
+    # Same order as ix_posts_favorite_count_id, so this reads the first `limit` index entries.
+    stmt = (
+        select(tables.Post)
+        .where(tables.Post.favorite_count > 0)
+        .order_by(tables.Post.favorite_count.desc(), tables.Post.id.desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def repair_favorite_counts(session: AsyncSession) -> int:
+    """Recomputes favorite_count from the favorites table; returns how many posts were off."""
+    actual = (
+        select(func.count())
+        .select_from(tables.Favorite)
+        .where(tables.Favorite.post_id == tables.Post.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(tables.Post)
+        .where(tables.Post.favorite_count != actual)
+        .values(favorite_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    await session.commit()
+    if result.rowcount:
+        page_cache.clear()
+    return result.rowcount
+
+
+async def repair_comment_counts(session: AsyncSession) -> int:
+    """Recomputes comment_count from the comments table; returns how many posts were off."""
+    actual = (
+        select(func.count())
+        .select_from(tables.Comment)
+        .where(tables.Comment.post_id == tables.Post.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(tables.Post)
+        .where(tables.Post.comment_count != actual)
+        .values(comment_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    await session.commit()
+    if result.rowcount:
+        page_cache.clear()
+    return result.rowcount
+
+
+async def fan_out_posts(session: AsyncSession, post_ids: Sequence[int]) -> None:
+    """Pushes new posts into their authors' followers' timelines in one INSERT ... SELECT.
+
+    Posts by fanout_on_read authors are skipped; list_feed pulls those at read time.
+    Runs inside the caller's transaction.
+    """
+    post, sub, author = tables.Post, tables.Subscription, tables.User
+    rows = (
+        select(sub.follower_id, post.id, post.created_at)
+        .join(sub, sub.followee_id == post.author_id)
+        .join(author, author.id == post.author_id)
+        .where(post.id.in_(post_ids), author.fanout_on_read.is_(False))
+    )
+    timeline = tables.TimelineEntry
+    stmt = _insert(session, timeline).from_select([timeline.user_id, timeline.post_id, timeline.created_at], rows)
+    await session.execute(stmt.on_conflict_do_nothing())
+
+
+@outbox.handler(FAN_OUT_EVENT)
+async def _fan_out_events(session: AsyncSession, payloads: list[dict[str, Any]]) -> None:
+    await fan_out_posts(session, [post_id for payload in payloads for post_id in payload["post_ids"]])
+
+
+async def follow_user(session: AsyncSession, follower_id: int, followee_id: int) -> None:
+    if follower_id == followee_id:
+        raise ValueError("cannot follow yourself")
+
+    stmt = (
+        _insert(session, tables.Subscription)
+        .values(follower_id=follower_id, followee_id=followee_id)
+        .on_conflict_do_nothing()
+        .returning(tables.Subscription.followee_id)
+    )
+    try:
+        if (await session.execute(stmt)).first() is None:
+            await session.rollback()
+            return
+    except IntegrityError as e:
+        await session.rollback()
+        raise ValueError("user not found") from e
+
+    followee = await get_user(session, followee_id)
+    if not followee.fanout_on_read:
+        # Copy the followee's recent posts so the feed isn't empty until they post again.
+        post, timeline = tables.Post, tables.TimelineEntry
+        recent = (
+            select(literal(follower_id), post.id, post.created_at)
+            .where(post.author_id == followee_id)
+            .order_by(post.created_at.desc(), post.id.desc())
+            .limit(FEED_BACKFILL_SIZE)
+        )
+        stmt = _insert(session, timeline).from_select([timeline.user_id, timeline.post_id, timeline.created_at], recent)
+        await session.execute(stmt.on_conflict_do_nothing())
+
+        # Counting stops at the limit, so this stays cheap however large the account is.
+        followers = (
+            select(tables.Subscription.follower_id)
+            .where(tables.Subscription.followee_id == followee_id)
+            .limit(FANOUT_FOLLOWER_LIMIT)
+            .subquery()
+        )
+        count = (await session.execute(select(func.count()).select_from(followers))).scalar_one()
+        if count >= FANOUT_FOLLOWER_LIMIT:
+            # One-way switch: older pushed entries stay, and list_feed de-duplicates them
+            # against the pulled posts.
+            stmt = (
+                update(tables.User)
+                .where(tables.User.id == followee_id)
+                .values(fanout_on_read=True, updated_at=tables.User.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await session.execute(stmt)
+
+    await session.commit()
+    read_router.note_write(follower_id)
+    page_cache.invalidate(f"user:{follower_id}")
+
+
+async def unfollow_user(session: AsyncSession, follower_id: int, followee_id: int) -> None:
+    sub = tables.Subscription
+    result = await session.execute(delete(sub).where(sub.follower_id == follower_id, sub.followee_id == followee_id))
+    if result.rowcount:
+        timeline = tables.TimelineEntry
+        followee_posts = select(tables.Post.id).where(tables.Post.author_id == followee_id)
+        stmt = delete(timeline).where(timeline.user_id == follower_id, timeline.post_id.in_(followee_posts))
+        await session.execute(stmt)
+    await session.commit()
+    read_router.note_write(follower_id)
+    page_cache.invalidate(f"user:{follower_id}")
+
+
+async def is_following(session: AsyncSession, follower_id: int, followee_id: int) -> bool:
+    sub = tables.Subscription
+    stmt = select(sub.follower_id).where(sub.follower_id == follower_id, sub.followee_id == followee_id)
+    return (await session.execute(stmt)).first() is not None
+
+
+async def list_feed(
+    session: AsyncSession, user_id: int, *, cursor: str | None = None, limit: int = FEED_PAGE_SIZE
+) -> PostPage:
+    """Posts by the users ``user_id`` follows, newest first.
+
+    One query: a range scan of the user's timeline, UNIONed with the newest posts of any
+    followed fanout_on_read accounts (empty for most users).
+    """
+    post, timeline, sub, author = tables.Post, tables.TimelineEntry, tables.Subscription, tables.User
+
+    pushed = select(timeline.post_id.label("id"), timeline.created_at).where(timeline.user_id == user_id)
+    pulled_authors = (
+        select(sub.followee_id)
+        .join(author, author.id == sub.followee_id)
+        .where(sub.follower_id == user_id, author.fanout_on_read.is_(True))
+    )
+    pulled = select(post.id, post.created_at).where(post.author_id.in_(pulled_authors))
+    if cursor is not None:
+        anchor = select(post.created_at, post.id).where(post.id == decode_cursor(cursor)).scalar_subquery()
+        pushed = pushed.where(tuple_(timeline.created_at, timeline.post_id) < anchor)
+        pulled = pulled.where(tuple_(post.created_at, post.id) < anchor)
+    pushed = pushed.order_by(timeline.created_at.desc(), timeline.post_id.desc()).limit(limit + 1)
+    pulled = pulled.order_by(post.created_at.desc(), post.id.desc()).limit(limit + 1)
+
+    feed = union(select(pushed.subquery()), select(pulled.subquery())).subquery()
+    stmt = (
+        select(post)
+        .join(feed, feed.c.id == post.id)
+        .order_by(feed.c.created_at.desc(), feed.c.id.desc())
+        .limit(limit + 1)
+    )
+    posts = list((await session.execute(stmt)).scalars().all())
+    if len(posts) <= limit:
+        return PostPage(posts, None)
+    posts = posts[:limit]
+    return PostPage(posts, encode_cursor(posts[-1].id))
+
+
+async def get_or_create_tags(session: AsyncSession, names: Iterable[str]) -> dict[str, int]:
+    # Two statements however many tags: insert the missing ones, then read all ids back.
+    wanted = set(names)
+    if not wanted:
+        return {}
+    tag = tables.Tag.__table__
+    await session.execute(_insert(session, tag).on_conflict_do_nothing(), [{"name": name} for name in wanted])
+    result = await session.execute(select(tag.c.name, tag.c.id).where(tag.c.name.in_(wanted)))
+    return {row.name: row.id for row in result}
+
+
+async def _bump_tag_counts(session: AsyncSession, deltas: Counter[int]) -> None:
+    tag = tables.Tag.__table__
+    stmt = update(tag).where(tag.c.id == bindparam("tag_id")).values(post_count=tag.c.post_count + bindparam("delta"))
+    await session.execute(stmt, [{"tag_id": tag_id, "delta": delta} for tag_id, delta in deltas.items()])
+
+
+async def link_tags(session: AsyncSession, post_tags: dict[int, list[str]]) -> None:
+    """Tags freshly inserted posts, in the caller's transaction."""
+    ids = await get_or_create_tags(session, (name for names in post_tags.values() for name in names))
+    links = [{"post_id": post_id, "tag_id": ids[name]} for post_id, names in post_tags.items() for name in names]
+    if not links:
+        return
+    await session.execute(insert(tables.post_tags), links)
+    await _bump_tag_counts(session, Counter(link["tag_id"] for link in links))
+
+
+async def _retag_post(session: AsyncSession, post_id: int, names: list[str]) -> None:
+    pt = tables.post_tags
+    stmt = select(tables.Tag.name, tables.Tag.id).join(pt, pt.c.tag_id == tables.Tag.id).where(pt.c.post_id == post_id)
+    current = {row.name: row.id for row in await session.execute(stmt)}
+
+    removed = [tag_id for name, tag_id in current.items() if name not in names]
+    if removed:
+        await session.execute(delete(pt).where(pt.c.post_id == post_id, pt.c.tag_id.in_(removed)))
+        await _bump_tag_counts(session, Counter({tag_id: -1 for tag_id in removed}))
+
+    added = [name for name in names if name not in current]
+    if added:
+        await link_tags(session, {post_id: added})
+
+
+async def get_post_tags(session: AsyncSession, post_id: int) -> list[str]:
+    pt = tables.post_tags
+    stmt = (
+        select(tables.Tag.name)
+        .join(pt, pt.c.tag_id == tables.Tag.id)
+        .where(pt.c.post_id == post_id)
+        .order_by(tables.Tag.name)
+    )
+    return list((await session.execute(stmt)).scalars().all())
+
+
+async def tag_cloud(session: AsyncSession, limit: int = TAG_CLOUD_SIZE) -> list[tables.Tag]:
+    # Reads the head of ix_tags_post_count; no aggregation over post_tags.
+    stmt = (
+        select(tables.Tag)
+        .where(tables.Tag.post_count > 0)
+        .order_by(tables.Tag.post_count.desc(), tables.Tag.name)
+        .limit(limit)
+    )
+    return list((await session.execute(stmt)).scalars().all())
+
+
+async def repair_tag_counts(session: AsyncSession) -> int:
+    """Recomputes post_count from post_tags; returns how many tags were off."""
+    actual = (
+        select(func.count())
+        .select_from(tables.post_tags)
+        .where(tables.post_tags.c.tag_id == tables.Tag.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(tables.Tag)
+        .where(tables.Tag.post_count != actual)
+        .values(post_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    await session.commit()
+    return result.rowcount
+
+
+async def create_comment(session: AsyncSession, post_id: int, payload: CommentCreate) -> tables.Comment:
+    comment = tables.Comment
+    stmt = (
+        insert(comment).values(post_id=post_id, author_id=payload.author_id, content=payload.content).returning(comment)
+    )
+    try:
+        created = (await session.execute(stmt)).scalar_one()
+    except IntegrityError as e:
+        # SQLite doesn't say which foreign key failed; look only on this failure path.
+        await session.rollback()
+        if await get_post(session, post_id) is None:
+            raise ValueError("post not found") from e
+        raise ValueError("author does not exist") from e
+
+    await session.execute(
+        update(tables.Post)
+        .where(tables.Post.id == post_id)
+        .values(comment_count=tables.Post.comment_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    read_router.note_write(payload.author_id)
+    # Index pages tag every post they list, so this also refreshes their comment counts.
+    page_cache.invalidate(f"post:{post_id}")
+    return created
+
+
+async def list_comments(
+    session: AsyncSession, post_id: int, *, cursor: str | None = None, limit: int = COMMENTS_PAGE_SIZE
+) -> CommentPage:
+    """Oldest first, keyset-paginated on (created_at, id) within the post, with authors' logins."""
+    comment = tables.Comment
+    stmt = select(comment).where(comment.post_id == post_id).order_by(comment.created_at, comment.id).limit(limit + 1)
+    if cursor is not None:
+        anchor = select(comment.created_at, comment.id).where(comment.id == decode_cursor(cursor)).scalar_subquery()
+        stmt = stmt.where(tuple_(comment.created_at, comment.id) > anchor)
+
+    comments = list((await session.execute(stmt)).scalars().all())
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].id)
+    logins = await get_user_logins(session, (c.author_id for c in comments))
+    return CommentPage(comments, next_cursor, logins)
@@ -0,0 +1,356 @@
+import os
+import random
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any
+
+from sqlalchemy import Table, TextClause, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app import search, storage, tables
+from app.cache import page_cache
+from app.security import hashing
+
+# Rows per executemany and per transaction.
+GENERATE_BATCH_SIZE = int(os.getenv("GENERATE_BATCH_SIZE", "50000"))
+DEFAULT_PASSWORD = "password"
+# Generated activity spans the year before this instant; it is fixed so that a seed
+# always produces the same rows.
+DEFAULT_UNTIL = datetime(2026, 1, 1, tzinfo=timezone.utc)
+HISTORY = timedelta(days=365)
+TEXT_POOL_SIZE = 4096
+# Only for the generator's own connection: an OS crash mid-run can corrupt the file, which
+# is acceptable for throwaway load-test data and buys a large share of the insert rate.
+SQLITE_BULK_LOAD_PRAGMAS = ("PRAGMA synchronous=OFF", "PRAGMA cache_size=-262144", "PRAGMA temp_store=MEMORY")
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "fe", "gu", "ha", "ji", "wa")
+
+
+@dataclass
+class Spec:
+    users: int = 10_000
+    posts: int = 100_000
+    favorites: int = 200_000
+    subscriptions: int = 50_000
+    comments: int = 100_000
+    tags: int = 500
+    seed: int = 0
+    # Zipf exponent for authorship, followers, favorites and comments.
+    skew: float = 1.1
+    password: str = DEFAULT_PASSWORD
+    until: datetime = DEFAULT_UNTIL
+
+    def validate(self) -> None:
+        if self.posts and not self.users:
+            raise ValueError("posts need at least one user")
+        if self.subscriptions > self.users * (self.users - 1) // 2:
+            raise ValueError("too many subscriptions for this many users")
+        if self.favorites > self.users * self.posts // 2:
+            raise ValueError("too many favorites for this many users and posts")
+        if (self.comments or self.favorites) and not self.posts:
+            raise ValueError("favorites and comments need posts")
+
+
+@dataclass
+class GenerateReport:
+    rows: dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.seconds if self.seconds else 0.0
+
+
+def vocabulary(rng: random.Random, size: int) -> list[str]:
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4 + len(words) // 4096))))
+    return sorted(words)
+
+
+def zipf_weights(n: int, skew: float) -> list[float]:
+    """Cumulative weights for random.choices: rank k is drawn in proportion to 1 / k**skew."""
+    return list(accumulate(1 / rank**skew for rank in range(1, n + 1)))
+
+
+def _distinct_pairs(rng: random.Random, count: int, left, right, *, allow_equal: bool = True) -> list[tuple[int, int]]:
+    # Skewed draws repeat, so keep drawing until there are enough distinct pairs.
+    seen: set[tuple[int, int]] = set()
+    pairs: list[tuple[int, int]] = []
+    while len(pairs) < count:
+        want = count - len(pairs)
+        for pair in zip(left(want), right(want), strict=True):
+            if (allow_equal or pair[0] != pair[1]) and pair not in seen:
+                seen.add(pair)
+                pairs.append(pair)
+    return pairs[:count]
+
+
+class _BulkInsert:
+    """An INSERT compiled once by Core and sent as executemany of positional rows.
+
+    Skips building and processing a parameter dict per row, which is most of the cost of
+    ``session.execute(insert(table), dicts)`` at this volume.
+    """
+
+    def __init__(self, session: AsyncSession, table: Table, columns: Sequence[str]) -> None:
+        dialect = session.get_bind().dialect
+        compiled = insert(table).compile(dialect=dialect, column_keys=list(columns))
+        if list(compiled.positiontup or ()) != list(columns):
+            raise ValueError(f"columns must be listed in {table.name} table order")
+        self.sql = str(compiled)
+        self.processors = [
+            (i, processor)
+            for i, name in enumerate(columns)
+            if (processor := table.c[name].type.dialect_impl(dialect).bind_processor(dialect)) is not None
+        ]
+
+    async def __call__(self, session: AsyncSession, rows: list[list[Any]]) -> None:
+        for i, processor in self.processors:
+            for row in rows:
+                row[i] = processor(row[i])
+        connection = await session.connection()
+        await connection.exec_driver_sql(self.sql, [tuple(row) for row in rows])
+
+
+async def _load(
+    session: AsyncSession, report: GenerateReport, name: str, table: Table, columns: Sequence[str], rows
+) -> None:
+    bulk = _BulkInsert(session, table, columns)
+    for first in range(0, len(rows), GENERATE_BATCH_SIZE):
+        await bulk(session, [list(row) for row in rows[first : first + GENERATE_BATCH_SIZE]])
+        await session.commit()
+    report.rows[name] = report.rows.get(name, 0) + len(rows)
+
+
+@asynccontextmanager
+async def loading_session(engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    """A session pinned to one connection, so per-connection bulk-load settings last the whole run."""
+    async with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            for pragma in SQLITE_BULK_LOAD_PRAGMAS:
+                await connection.exec_driver_sql(pragma)
+            await connection.commit()
+        async with AsyncSession(bind=connection, expire_on_commit=False) as session:
+            yield session
+
+
+async def _max_id(session: AsyncSession, column) -> int:
+    return (await session.execute(select(func.coalesce(func.max(column), 0)))).scalar_one()
+
+
+async def generate(session: AsyncSession, spec: Spec) -> GenerateReport:
+    """Appends a deterministic, skewed synthetic dataset to the database.
+
+    New rows get ids after the current maximum, so this also works on a database that
+    already has data; denormalized counters are computed up front and written with the
+    rows. Every user's password is ``spec.password``, hashed once.
+    """
+    spec.validate()
+    report = GenerateReport()
+    started = time.perf_counter()
+    rng = random.Random(spec.seed)
+    first_user = await _max_id(session, tables.User.id) + 1
+    first_post = await _max_id(session, tables.Post.id) + 1
+    oldest = spec.until - HISTORY
+    step = HISTORY / max(spec.posts, 1)
+
+    # A random rank order per entity, then Zipf draws over the ranks: a few users write,
+    # get followed and comment most, and a few posts collect most favorites.
+    users = list(range(first_user, first_user + spec.users))
+    ranked_users = users[:]
+    rng.shuffle(ranked_users)
+    user_weights = zipf_weights(spec.users, spec.skew)
+    posts = list(range(first_post, first_post + spec.posts))
+    ranked_posts = posts[:]
+    rng.shuffle(ranked_posts)
+    post_weights = zipf_weights(spec.posts, spec.skew)
+
+    def skewed_users(k: int) -> list[int]:
+        return rng.choices(ranked_users, cum_weights=user_weights, k=k)
+
+    def skewed_posts(k: int) -> list[int]:
+        return rng.choices(ranked_posts, cum_weights=post_weights, k=k)
+
+    def any_users(k: int) -> list[int]:
+        return rng.choices(users, k=k)
+
+    def posted_at(post_id: int) -> datetime:
+        return oldest + step * (post_id - first_post)
+
+    subscriptions = _distinct_pairs(rng, spec.subscriptions, any_users, skewed_users, allow_equal=False)
+    followers = Counter(followee for _, followee in subscriptions)
+    favorites = _distinct_pairs(rng, spec.favorites, skewed_users, skewed_posts)
+    commented = list(zip(skewed_posts(spec.comments), skewed_users(spec.comments), strict=True))
+    favorite_counts = Counter(post_id for _, post_id in favorites)
+    comment_counts = Counter(post_id for post_id, _ in commented)
+
+    words = vocabulary(rng, 2000)
+    titles = [" ".join(rng.choices(words, k=rng.randint(3, 8))).capitalize() for _ in range(TEXT_POOL_SIZE)]
+    bodies = [" ".join(rng.choices(words, k=rng.randint(20, 120))) for _ in range(TEXT_POOL_SIZE)]
+    tag_names = vocabulary(random.Random(spec.seed + 1), spec.tags) if spec.tags else []
+    tag_weights = zipf_weights(len(tag_names), spec.skew)
+
+    password_hash = await hashing.hash(spec.password)
+    await _load(
+        session,
+        report,
+        "users",
+        tables.User.__table__,
+        ("id", "email", "login", "password_hash", "fanout_on_read", "created_at", "updated_at"),
+        [
+            (
+                user_id,
+                f"user{user_id}@example.com",
+                f"user{user_id}",
+                password_hash,
+                followers[user_id] >= storage.FANOUT_FOLLOWER_LIMIT,
+                oldest,
+                oldest,
+            )
+            for user_id in users
+        ],
+    )
+
+    tag_ids = await storage.get_or_create_tags(session, tag_names)
+    await session.commit()
+    post_columns = (
+        "id",
+        "author_id",
+        "title",
+        "content",
+        "favorite_count",
+        "comment_count",
+        "created_at",
+        "updated_at",
+    )
+    post_insert = _BulkInsert(session, tables.Post.__table__, post_columns)
+    link_insert = _BulkInsert(session, tables.post_tags, ("post_id", "tag_id"))
+    for first in range(0, spec.posts, GENERATE_BATCH_SIZE):
+        batch = posts[first : first + GENERATE_BATCH_SIZE]
+        authors = skewed_users(len(batch))
+        rows = []
+        indexed = []
+        links = []
+        for post_id, author_id in zip(batch, authors, strict=True):
+            title = titles[rng.randrange(TEXT_POOL_SIZE)]
+            content = bodies[rng.randrange(TEXT_POOL_SIZE)]
+            created_at = posted_at(post_id)
+            rows.append(
+                [
+                    post_id,
+                    author_id,
+                    title,
+                    content,
+                    favorite_counts[post_id],
+                    comment_counts[post_id],
+                    created_at,
+                    created_at,
+                ]
+            )
+            indexed.append({"id": post_id, "title": title, "content": content})
+            if tag_names:
+                names = set(rng.choices(tag_names, cum_weights=tag_weights, k=rng.choice((0, 1, 1, 2, 2, 3))))
+                links += [[post_id, tag_ids[name]] for name in names]
+        await post_insert(session, rows)
+        await search.index_new_posts(session, indexed)
+        if links:
+            await link_insert(session, links)
+        await session.commit()
+        report.rows["posts"] = report.rows.get("posts", 0) + len(rows)
+        report.rows["post_tags"] = report.rows.get("post_tags", 0) + len(links)
+    if tag_names:
+        await storage.repair_tag_counts(session)
+
+    def reacted_at(post_id: int) -> datetime:
+        created_at = posted_at(post_id)
+        return created_at + (spec.until - created_at) * rng.random()
+
+    await _load(
+        session,
+        report,
+        "subscriptions",
+        tables.Subscription.__table__,
+        ("follower_id", "followee_id", "created_at"),
+        [(follower, followee, oldest) for follower, followee in subscriptions],
+    )
+    await _load(
+        session,
+        report,
+        "favorites",
+        tables.Favorite.__table__,
+        ("user_id", "post_id", "created_at"),
+        [(user_id, post_id, reacted_at(post_id)) for user_id, post_id in favorites],
+    )
+    comment_rows = []
+    for post_id, author_id in commented:
+        created_at = reacted_at(post_id)
+        comment_rows.append((post_id, author_id, bodies[rng.randrange(TEXT_POOL_SIZE)], created_at, created_at))
+    comment_rows.sort(key=lambda row: row[3])
+    await _load(
+        session,
+        report,
+        "comments",
+        tables.Comment.__table__,
+        ("post_id", "author_id", "content", "created_at", "updated_at"),
+        comment_rows,
+    )
+
+    report.rows["timeline"] = await _backfill_timelines(session, first_user)
+    await _advance_sequences(session, [tables.User.__table__, tables.Post.__table__])
+    # Only this process's cache: a server running elsewhere catches up within PAGE_CACHE_TTL.
+    page_cache.clear()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _advance_sequence(table: Table) -> TextClause:
+    """Moves a serial id's sequence past the ids inserted explicitly above."""
+    return text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))")
+
+
+async def _advance_sequences(session: AsyncSession, loaded: Sequence[Table]) -> None:
+    # SQLite picks max(rowid) + 1 by itself; Postgres would hand out the generated ids again.
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    for table in loaded:
+        await session.execute(_advance_sequence(table))
+    await session.commit()
+
+
+async def _backfill_timelines(session: AsyncSession, first_user: int) -> int:
+    # What follow_user would have copied for every generated subscription: the followee's
+    # latest FEED_BACKFILL_SIZE posts, unless the followee is read with fan-out-on-read.
+    post, sub, user, timeline = tables.Post, tables.Subscription, tables.User, tables.TimelineEntry
+    ranked = select(
+        post.id,
+        post.author_id,
+        post.created_at,
+        func.row_number()
+        .over(partition_by=post.author_id, order_by=(post.created_at.desc(), post.id.desc()))
+        .label("recency"),
+    ).subquery()
+    recent = (
+        select(sub.follower_id, ranked.c.id, ranked.c.created_at)
+        .join(ranked, ranked.c.author_id == sub.followee_id)
+        .join(user, user.id == sub.followee_id)
+        .where(
+            sub.follower_id >= first_user,
+            ranked.c.recency <= storage.FEED_BACKFILL_SIZE,
+            user.fanout_on_read.is_(False),
+        )
+        # In primary-key order, so the B-tree is appended to rather than split at random.
+        .order_by(sub.follower_id, ranked.c.id)
+    )
+    stmt = insert(timeline).from_select([timeline.user_id, timeline.post_id, timeline.created_at], recent)
+    result = await session.execute(stmt)
+    await session.commit()
+    return result.rowcount
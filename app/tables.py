@@ -1,25 +1,39 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy import (
+    JSON,
     TIMESTAMP,
+    Boolean,
     CheckConstraint,
     Column,
     ForeignKey,
+    Index,
+    Integer,
     String,
     Table,
     Text,
+    desc,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 
 from .database import Base
 
+
+def utcnow() -> datetime:
+    # SQLite's CURRENT_TIMESTAMP only has second precision, which is too coarse for
+    # updated_at-based ETags; stamp updates from Python with microseconds instead.
+    return datetime.now(timezone.utc)
+
+
 # Association table for Post <-> Tag (Many-to-Many)
 post_tags = Table(
     "post_tags",
     Base.metadata,
     Column("post_id", ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Tag filters look posts up by tag; the primary key only serves lookups by post.
+    Index("ix_post_tags_tag_id", "tag_id", "post_id"),
 )
 
 
@@ -30,10 +44,11 @@ class User(Base):
     email: Mapped[str] = mapped_column(String, unique=True, index=True)
     login: Mapped[str] = mapped_column(String, unique=True, index=True)
     password_hash: Mapped[str] = mapped_column(String)
+    # Set once the account has too many followers to fan posts out to; their posts are
+    # then pulled into followers' feeds at read time instead.
+    fanout_on_read: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
-    )
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=utcnow)
 
     posts: Mapped[list["Post"]] = relationship(back_populates="author", cascade="all, delete")
     comments: Mapped[list["Comment"]] = relationship(back_populates="author", cascade="all, delete")
@@ -63,25 +78,37 @@ class Post(Base):
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     title: Mapped[str] = mapped_column(String)
     content: Mapped[str] = mapped_column(Text)
+    # Denormalized count of favorites rows; maintained by storage, rebuilt by `app.cli repair-counts`.
+    favorite_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    # Likewise for comments, so listings can show counts without grouping over comments.
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
-    )
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=utcnow)
 
     author: Mapped["User"] = relationship(back_populates="posts")
     tags: Mapped[list["Tag"]] = relationship(secondary=post_tags, back_populates="posts")
     comments: Mapped[list["Comment"]] = relationship(back_populates="post", cascade="all, delete")
     favorited_by: Mapped[list["Favorite"]] = relationship(back_populates="post", cascade="all, delete")
 
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_author_id_created_at", "author_id", desc("created_at"), desc("id")),
+        Index("ix_posts_favorite_count_id", desc("favorite_count"), desc("id")),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, unique=True, index=True)
+    # Denormalized count of post_tags rows; maintained by storage, rebuilt by `app.cli repair-counts`.
+    post_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     posts: Mapped[list["Post"]] = relationship(secondary=post_tags, back_populates="tags")
 
+    __table_args__ = (Index("ix_tags_post_count", desc("post_count"), "name"),)
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -91,13 +118,16 @@ class Comment(Base):
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     content: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
-    )
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=utcnow)
 
     post: Mapped["Post"] = relationship(back_populates="comments")
     author: Mapped["User"] = relationship(back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at", "id"),
+        Index("ix_comments_author_id", "author_id"),
+    )
+
 
 class Favorite(Base):
     __tablename__ = "favorites"
@@ -120,4 +150,40 @@ class Subscription(Base):
     follower: Mapped["User"] = relationship("User", foreign_keys=[follower_id], back_populates="following")
     followee: Mapped["User"] = relationship("User", foreign_keys=[followee_id], back_populates="followers")
 
-    __table_args__ = (CheckConstraint("follower_id != followee_id", name="check_not_self_follow"),)
+    __table_args__ = (
+        CheckConstraint("follower_id != followee_id", name="check_not_self_follow"),
+        Index("ix_subscriptions_followee_id", "followee_id"),
+    )
+
+
+class TimelineEntry(Base):
+    """A post pushed into a follower's feed; created_at is copied from the post for ordering."""
+
+    __tablename__ = "timeline"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True))
+
+    __table_args__ = (Index("ix_timeline_user_id_created_at", "user_id", desc("created_at"), desc("post_id")),)
+
+
+class OutboxEvent(Base):
+    """A side effect to run after the transaction that wrote it commits (see app.outbox).
+
+    Claimed events get ``available_at`` pushed into the future, so a worker that dies
+    mid-batch only delays them; events that keep failing stop at ``attempts`` ==
+    OUTBOX_MAX_ATTEMPTS and stay for inspection.
+    """
+
+    __tablename__ = "outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=utcnow)
+    available_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), default=utcnow)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+    __table_args__ = (Index("ix_outbox_available_at", "available_at", "id"),)
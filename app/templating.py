@@ -0,0 +1,140 @@
+import os
+import time
+from collections.abc import AsyncIterator, Callable, Mapping
+from pathlib import Path
+from typing import Any
+
+from fastapi.responses import HTMLResponse, StreamingResponse
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+from markupsafe import Markup
+from starlette.background import BackgroundTask
+
+from app.metrics import current_request, observe_render
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+
+# Deployments that only set DB_PROFILE=production keep their production defaults.
+APP_ENV = os.getenv("APP_ENV", os.getenv("DB_PROFILE", "development"))
+# Off in production: templates are compiled once at startup and never stat()ed again.
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "1" if APP_ENV == "development" else "0") == "1"
+# Compiled templates are kept here across restarts and shared by workers; unset picks a
+# per-user directory under the system temp dir, "off" disables the cache.
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR")
+
+# Output is coalesced into chunks of about this size; `{{ flush() }}` in a template
+# sends whatever is buffered right away (e.g. the page chrome before the first query).
+STREAM_CHUNK_SIZE = 8192
+FLUSH = Markup("<!-- flush -->")
+
+
+class TimedTemplate(Template):
+    """Records ``render_async()`` time in the template_render_seconds metric."""
+
+    async def render_async(self, *args: Any, **kwargs: Any) -> str:
+        started = time.perf_counter()
+        try:
+            return await super().render_async(*args, **kwargs)
+        finally:
+            observe_render(self.name or "<string>", time.perf_counter() - started)
+
+
+def _bytecode_cache() -> FileSystemBytecodeCache | None:
+    if TEMPLATE_CACHE_DIR == "off":
+        return None
+    if TEMPLATE_CACHE_DIR:
+        Path(TEMPLATE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
+# The one environment every page is rendered with. It is async so pages can stream, which
+# means whole-page responses go through render_template() rather than Jinja2Templates.
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    enable_async=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache(),
+)
+env.globals["flush"] = lambda: FLUSH
+env.template_class = TimedTemplate
+
+
+def precompile_templates() -> list[str]:
+    """Loads every template into the environment (and the bytecode cache); returns their names."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+async def render_template(
+    name: str, context: Mapping[str, Any], status_code: int = 200, headers: Mapping[str, str] | None = None
+) -> HTMLResponse:
+    """Renders the whole page before responding, for pages whose body is needed (e.g. cached)."""
+    html = await env.get_template(name).render_async(context)
+    return HTMLResponse(html, status_code, headers)
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """Renders a template with ``generate_async`` and sends it while it renders.
+
+    Context values may be async iterables, so rows can be pulled from the database as
+    the template loops over them. ``on_complete`` receives the full page once the last
+    chunk has been produced (it is not called if rendering fails or the client leaves).
+    """
+
+    media_type = "text/html"
+
+    def __init__(
+        self,
+        name: str,
+        context: Mapping[str, Any],
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        on_complete: Callable[[str], None] | None = None,
+        background: BackgroundTask | None = None,
+    ) -> None:
+        self.template = env.get_template(name)
+        self.context = context
+        super().__init__(self._render(on_complete), status_code, headers, self.media_type, background)
+
+    async def _generate(self) -> AsyncIterator[str]:
+        # Render time excludes waiting on the client between chunks and the SQL run by
+        # async iterables in the context, so it stays comparable with render().
+        stats = current_request.get()
+        db_before = stats.db_seconds if stats else 0.0
+        busy = 0.0
+        chunks = self.template.generate_async(self.context)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                break
+            finally:
+                busy += time.perf_counter() - started
+            yield chunk
+        db_seconds = stats.db_seconds - db_before if stats else 0.0
+        observe_render(self.template.name or "<string>", busy - db_seconds)
+
+    async def _render(self, on_complete: Callable[[str], None] | None) -> AsyncIterator[str]:
+        page: list[str] = []
+        buffer: list[str] = []
+        size = 0
+        async for chunk in self._generate():
+            if chunk == FLUSH:
+                if buffer:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                continue
+            if on_complete is not None:
+                page.append(chunk)
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+        if on_complete is not None:
+            on_complete("".join(page))
@@ -0,0 +1,255 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import NamedTuple, TypeVar
+
+from anyio import to_thread
+
+from app.cache import LRUCache
+from app.metrics import registry
+
+LOGIN_THROTTLE = os.getenv("LOGIN_THROTTLE", "1") == "1"
+# Per client IP: a burst, then a steady rate. Generous, since users can share a NAT.
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "30"))
+# Per account name, whichever IPs the attempts come from.
+LOGIN_ACCOUNT_BURST = int(os.getenv("LOGIN_ACCOUNT_BURST", "5"))
+LOGIN_ACCOUNT_PER_MINUTE = float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", "5"))
+# After this many failures in a row a key is locked out for BASE, 2 * BASE, 4 * BASE, ...
+LOGIN_BACKOFF_AFTER = int(os.getenv("LOGIN_BACKOFF_AFTER", "5"))
+LOGIN_BACKOFF_BASE = float(os.getenv("LOGIN_BACKOFF_BASE", "1"))
+LOGIN_BACKOFF_MAX = float(os.getenv("LOGIN_BACKOFF_MAX", "900"))
+# Failures are forgotten once a key has been quiet this long after its last failure or
+# lockout, so a shared NAT doesn't build up a lifetime count.
+LOGIN_BACKOFF_RESET = float(os.getenv("LOGIN_BACKOFF_RESET", "900"))
+# Keys tracked at once; the least recently seen are forgotten first.
+LOGIN_THROTTLE_KEYS = int(os.getenv("LOGIN_THROTTLE_KEYS", "100000"))
+# A SQLite file shared by all workers on the host (ideally on tmpfs, e.g. /dev/shm);
+# empty keeps the state per process.
+LOGIN_THROTTLE_DB = os.getenv("LOGIN_THROTTLE_DB", "")
+# How long an update may wait for another worker's lock before the attempt is let through.
+LOGIN_THROTTLE_BUSY_TIMEOUT_MS = int(os.getenv("LOGIN_THROTTLE_BUSY_TIMEOUT_MS", "100"))
+
+logger = logging.getLogger(__name__)
+
+login_rejections = registry.counter(
+    "login_throttled_total", "Login attempts rejected before the password check", ("scope",)
+)
+
+T = TypeVar("T")
+
+
+class KeyState(NamedTuple):
+    tokens: float
+    updated_at: float
+    failures: int = 0
+    blocked_until: float = 0.0
+    failed_at: float = 0.0
+
+
+@dataclass(frozen=True)
+class Bucket:
+    capacity: float
+    per_second: float
+
+    def refill(self, state: KeyState | None, now: float) -> KeyState:
+        if state is None:
+            return KeyState(self.capacity, now)
+        tokens = min(self.capacity, state.tokens + (now - state.updated_at) * self.per_second)
+        return state._replace(tokens=tokens, updated_at=now)
+
+
+class MemoryBackend:
+    """Per-process state in an LRU table of at most ``maxsize`` keys."""
+
+    def __init__(self, maxsize: int = LOGIN_THROTTLE_KEYS) -> None:
+        self._states = LRUCache(maxsize)
+
+    async def update(self, key: str, change: Callable[[KeyState | None], tuple[KeyState, T]]) -> T | None:
+        state, result = change(self._states.get(key))
+        self._states.set(key, state)
+        return result
+
+    def clear(self) -> None:
+        self._states.clear()
+
+
+class SQLiteBackend:
+    """State in a local SQLite file, so every worker on the host sees the same buckets.
+
+    Each update is one short ``BEGIN IMMEDIATE`` transaction, run in a worker thread so a
+    contended lock never stalls the event loop; the file is a cache, so it runs without
+    fsync. If the lock isn't had within ``busy_timeout_ms`` the update is skipped (the
+    attempt is let through) rather than making the login wait. Rows beyond ``maxsize`` are
+    pruned oldest first every ``prune_every`` writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = LOGIN_THROTTLE_KEYS,
+        prune_every: int = 1000,
+        busy_timeout_ms: int = LOGIN_THROTTLE_BUSY_TIMEOUT_MS,
+    ) -> None:
+        self.maxsize = maxsize
+        self.prune_every = prune_every
+        self._writes = 0
+        # One connection shared by the worker threads, used by one of them at a time.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS login_throttle (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, failures INTEGER NOT NULL, blocked_until REAL NOT NULL, "
+            "failed_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(login_throttle)")}
+        if "failed_at" not in columns:
+            # A file written by an older version; the shared file outlives deploys.
+            self._db.execute("ALTER TABLE login_throttle ADD COLUMN failed_at REAL NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_login_throttle_updated_at ON login_throttle (updated_at)")
+
+    async def update(self, key: str, change: Callable[[KeyState | None], tuple[KeyState, T]]) -> T | None:
+        try:
+            return await to_thread.run_sync(self._update, key, change)
+        except sqlite3.OperationalError as e:
+            logger.warning("login throttle state unavailable, letting the attempt through: %s", e)
+            return None
+
+    def _update(self, key: str, change: Callable[[KeyState | None], tuple[KeyState, T]]) -> T:
+        with self._lock:
+            return self._transaction(key, change)
+
+    def _transaction(self, key: str, change: Callable[[KeyState | None], tuple[KeyState, T]]) -> T:
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT tokens, updated_at, failures, blocked_until, failed_at FROM login_throttle WHERE key = ?",
+                (key,),
+            ).fetchone()
+            state, result = change(KeyState(*row) if row else None)
+            db.execute("INSERT OR REPLACE INTO login_throttle VALUES (?, ?, ?, ?, ?, ?)", (key, *state))
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def _prune(self) -> None:
+        self._db.execute(
+            "DELETE FROM login_throttle WHERE updated_at < "
+            "(SELECT updated_at FROM login_throttle ORDER BY updated_at DESC LIMIT 1 OFFSET ?)",
+            (self.maxsize - 1,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM login_throttle")
+
+
+class LoginThrottle:
+    """Token buckets per client IP and per account, plus exponential backoff on failures.
+
+    ``check`` runs before the user lookup and bcrypt: it takes one token from the IP's
+    bucket and then the account's, and returns how many seconds the client must wait
+    (0.0 when the attempt may proceed). ``failed`` and ``succeeded`` report the outcome;
+    a success only clears the account's failures, so logging into one owned account
+    between guesses doesn't lift the IP's lockout. A key's failures are forgotten after
+    ``backoff_reset`` quiet seconds.
+    """
+
+    def __init__(
+        self,
+        backend: MemoryBackend | SQLiteBackend,
+        ip: Bucket = Bucket(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60),
+        account: Bucket = Bucket(LOGIN_ACCOUNT_BURST, LOGIN_ACCOUNT_PER_MINUTE / 60),
+        backoff_after: int = LOGIN_BACKOFF_AFTER,
+        backoff_base: float = LOGIN_BACKOFF_BASE,
+        backoff_max: float = LOGIN_BACKOFF_MAX,
+        backoff_reset: float = LOGIN_BACKOFF_RESET,
+        enabled: bool = LOGIN_THROTTLE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.backend = backend
+        self.buckets = {"ip": ip, "account": account}
+        self.backoff_after = backoff_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.backoff_reset = backoff_reset
+        self.enabled = enabled
+        self.clock = clock
+
+    @staticmethod
+    def _keys(ip: str, account: str) -> dict[str, str]:
+        # Account names are folded so "Alice" and "alice " share one bucket.
+        return {"ip": f"ip:{ip}", "account": f"account:{account.strip().lower()}"}
+
+    async def check(self, ip: str, account: str) -> float:
+        if not self.enabled:
+            return 0.0
+        now = self.clock()
+        for scope, key in self._keys(ip, account).items():
+            bucket = self.buckets[scope]
+
+            def take(state: KeyState | None, bucket: Bucket = bucket) -> tuple[KeyState, float]:
+                state = bucket.refill(state, now)
+                if state.blocked_until > now:
+                    return state, state.blocked_until - now
+                if state.tokens < 1:
+                    return state, (1 - state.tokens) / bucket.per_second if bucket.per_second else math.inf
+                return state._replace(tokens=state.tokens - 1), 0.0
+
+            wait = await self.backend.update(key, take)
+            if wait:
+                login_rejections.inc(scope)
+                return wait
+        return 0.0
+
+    async def failed(self, ip: str, account: str) -> None:
+        if not self.enabled:
+            return
+        now = self.clock()
+        for scope, key in self._keys(ip, account).items():
+
+            def record(state: KeyState | None, bucket: Bucket = self.buckets[scope]) -> tuple[KeyState, None]:
+                state = bucket.refill(state, now)
+                failures = state.failures
+                if now - max(state.failed_at, state.blocked_until) > self.backoff_reset:
+                    failures = 0
+                failures += 1
+                blocked_until = state.blocked_until
+                if failures >= self.backoff_after:
+                    # Past 2**32 the delay is capped anyway; an unbounded exponent overflows.
+                    exponent = min(failures - self.backoff_after, 32)
+                    blocked_until = now + min(self.backoff_max, self.backoff_base * 2**exponent)
+                return state._replace(failures=failures, blocked_until=blocked_until, failed_at=now), None
+
+            await self.backend.update(key, record)
+
+    async def succeeded(self, ip: str, account: str) -> None:
+        if not self.enabled:
+            return
+        now = self.clock()
+        bucket = self.buckets["account"]
+
+        def reset(state: KeyState | None) -> tuple[KeyState, None]:
+            return bucket.refill(state, now)._replace(failures=0, blocked_until=0.0), None
+
+        await self.backend.update(self._keys(ip, account)["account"], reset)
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds))) if math.isfinite(seconds) else str(int(LOGIN_BACKOFF_MAX))
+
+
+login_throttle = LoginThrottle(SQLiteBackend(LOGIN_THROTTLE_DB) if LOGIN_THROTTLE_DB else MemoryBackend())
@@ -0,0 +1,96 @@
+"""p99 latency of GET / while a burst of logins is hashing passwords.
+
+Runs the app in-process twice against a throwaway SQLite file: first with
+HASH_EXECUTOR=inline (bcrypt on the event loop, the old behaviour), then with the
+bounded thread pool, and prints latency percentiles for the page requests.
+
+    python benchmarks/login_burst.py --logins 50 --readers 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def burst(client, logins: int, readers: int) -> list[float]:
+    latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def login() -> None:
+        response = await client.post("/login", data={"login": "bench", "password": "benchmark"})
+        assert response.status_code == 303, response.status_code
+
+    async def reader() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/")
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    await asyncio.sleep(0)
+    await asyncio.gather(*(login() for _ in range(logins)))
+    done.set()
+    await asyncio.gather(*reader_tasks)
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    from httpx import ASGITransport, AsyncClient
+
+    from app import database
+    from app.main import app
+    from app.security import hashing
+    from app.tables import Base
+
+    database.engine.echo = False
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        await client.post("/register", data={"email": "bench@example.com", "login": "bench", "password": "benchmark"})
+        user = (await client.get("/users/")).json()[0]
+        for i in range(20):
+            await client.post("/posts/", json={"authorId": user["id"], "title": f"Post {i}", "content": "..."})
+
+        print(f"{'executor':<10} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for kind in ("inline", args.executor):
+            hashing.configure(kind, args.workers, args.workers)
+            latencies = await burst(client, args.logins, args.readers)
+            print(
+                f"{kind:<10} {len(latencies):>8} {percentile(latencies, 50):>8.1f} "
+                f"{percentile(latencies, 99):>8.1f} {max(latencies):>8.1f}"
+            )
+        hashing.shutdown()
+
+    await database.engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="concurrent login attempts in the burst")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent GET / loops during the burst")
+    parser.add_argument("--workers", type=int, default=4, help="hashing pool size")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        # Every login comes from one client address; this measures bcrypt, not the throttle.
+        os.environ["LOGIN_THROTTLE"] = "0"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
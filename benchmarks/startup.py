@@ -0,0 +1,101 @@
+"""Worker cold-start time and memory with and without the template bytecode cache.
+
+Each sample is a fresh interpreter that imports the app, runs its startup (which
+precompiles every template) and serves one page. Three configurations are compared:
+no bytecode cache, an empty cache directory (first start after a deploy) and a warm
+one (every later start, and every other worker).
+
+    python benchmarks/startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def child() -> None:
+    import asyncio
+    import resource
+    import time
+
+    started = time.perf_counter()
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app, lifespan
+
+    imported = time.perf_counter()
+
+    async def serve() -> tuple[float, float]:
+        async with lifespan(app):
+            ready = time.perf_counter()
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+                response = await client.get("/login")
+                assert response.status_code == 200, response.status_code
+            return ready, time.perf_counter()
+
+    ready, served = asyncio.run(serve())
+    result = {
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_page_ms": (served - ready) * 1000,
+        "total_ms": (served - started) * 1000,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(json.dumps(result))
+
+
+def sample(cache_dir: str, database: Path) -> dict[str, float]:
+    env = {
+        **os.environ,
+        "TEMPLATE_CACHE_DIR": cache_dir,
+        "APP_ENV": "production",
+        "DB_PROFILE": "production",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{database}",
+        "METRICS_ENABLED": "1",
+    }
+    out = subprocess.run(
+        [sys.executable, __file__, "--child"], env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="interpreters started per configuration")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        sys.path.insert(0, str(ROOT))
+        child()
+        return
+
+    print(
+        f"{'configuration':<14} {'import ms':>10} {'startup ms':>11} {'1st page ms':>12} {'total ms':>9} {'RSS MB':>7}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / "startup.db"
+        cache = Path(tmp) / "jinja"
+        configurations = {
+            "no cache": lambda: "off",
+            "cold cache": lambda: shutil.rmtree(cache, ignore_errors=True) or str(cache),
+            "warm cache": lambda: str(cache),
+        }
+        for name, prepare in configurations.items():
+            samples = [sample(prepare(), database) for _ in range(args.runs)]
+            medians = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+            print(
+                f"{name:<14} {medians['import_ms']:>10.1f} {medians['startup_ms']:>11.1f} "
+                f"{medians['first_page_ms']:>12.1f} {medians['total_ms']:>9.1f} {medians['max_rss_mb']:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Throughput and p50/p95/p99 latency per route against a large seeded SQLite file.
+
+The app runs in-process behind httpx's ASGI transport and ``--concurrency`` client tasks
+share each route's request count. Seeded databases are kept in benchmarks/data/ per
+size and seed, so only the first run pays for seeding. Results are written as JSON;
+with a baseline, routes whose p95 grew or throughput fell by more than ``--tolerance``
+are reported and the exit status is 1.
+
+    python benchmarks/suite.py --users 10000 --posts 1000000 --concurrency 16
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --routes post_page,search --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BENCH_DIR.parent))
+
+PASSWORD = "benchmark"
+DATA_DIR = BENCH_DIR / "data"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCH_DIR / "results.json"
+
+
+@dataclass
+class Dataset:
+    users: int
+    posts: int
+    words: list[str]
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[random.Random, Dataset], tuple[str, str, dict[str, Any]]]
+    # Share of --requests this route gets; logins pay for bcrypt, so they get fewer.
+    share: float = 1.0
+    expected: frozenset[int] = field(default_factory=lambda: frozenset({200}))
+
+
+def _encode_cursor(post_id: int) -> str:
+    from app.storage import encode_cursor
+
+    return encode_cursor(post_id)
+
+
+SCENARIOS = [
+    Scenario("index", lambda rng, data: ("GET", "/", {})),
+    Scenario("post_page", lambda rng, data: ("GET", f"/html/posts/{rng.randint(1, data.posts)}", {})),
+    Scenario("search", lambda rng, data: ("GET", "/", {"params": {"q": rng.choice(data.words)}})),
+    Scenario("posts_api", lambda rng, data: ("GET", "/posts/", {})),
+    Scenario(
+        "posts_api_deep",
+        lambda rng, data: ("GET", "/posts/", {"params": {"cursor": _encode_cursor(rng.randint(1, data.posts))}}),
+    ),
+    Scenario(
+        "login",
+        lambda rng, data: (
+            "POST",
+            "/login",
+            {"data": {"login": f"user{rng.randint(1, data.users)}", "password": PASSWORD}},
+        ),
+        share=0.1,
+        expected=frozenset({303}),
+    ),
+]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_scenario(client, scenario: Scenario, data: Dataset, total: int, concurrency: int, rng) -> dict:
+    requests = [scenario.build(rng, data) for _ in range(total)]
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while requests:
+            method, path, kwargs = requests.pop()
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in scenario.expected:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']:.0f} -> {current['rps']:.0f} req/s")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def dataset_path(args: argparse.Namespace) -> Path:
+    return DATA_DIR / f"synthetic-u{args.users}-p{args.posts}-s{args.seed}.db"
+
+
+async def seed(path: Path, users: int, posts: int, seed: int) -> None:
+    """Users and posts only, written by the same generator as ``app.cli generate``."""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app import synthetic, tables
+    from app.security import hashing
+
+    spec = synthetic.Spec(
+        users=users, posts=posts, favorites=0, subscriptions=0, comments=0, tags=0, seed=seed, password=PASSWORD
+    )
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(tables.Base.metadata.create_all)
+    async with synthetic.loading_session(engine) as session:
+        report = await synthetic.generate(session, spec)
+        await session.execute(text("ANALYZE"))
+        await session.commit()
+    await engine.dispose()
+    hashing.shutdown()
+    print(f"seeded {users} users and {posts} posts into {path} in {report.seconds:.1f}s", file=sys.stderr)
+
+
+def search_words(path: Path, titles: int = 2000) -> list[str]:
+    # Drawn from the generated titles, so every search has hits.
+    with closing(sqlite3.connect(path)) as db:
+        rows = db.execute("SELECT title FROM posts ORDER BY id LIMIT ?", (titles,)).fetchall()
+    return sorted({word.lower() for (title,) in rows for word in title.split()})
+
+
+async def ensure_dataset(args: argparse.Namespace, path: Path) -> None:
+    if path.exists() and not args.reseed:
+        return
+    DATA_DIR.mkdir(exist_ok=True)
+    # Seed under a temporary name so an interrupted run is never mistaken for a dataset.
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    await seed(partial, args.users, args.posts, args.seed)
+    partial.replace(path)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from httpx import ASGITransport, AsyncClient
+
+    from app import database
+    from app.main import app
+    from app.security import hashing
+
+    data = Dataset(args.users, args.posts, search_words(dataset_path(args)))
+    rng = random.Random(args.seed)
+    selected = [s for s in SCENARIOS if not args.routes or s.name in args.routes]
+    routes: dict[str, dict] = {}
+
+    print(f"{'route':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for scenario in selected:
+            total = max(1, int(args.requests * scenario.share))
+            await run_scenario(client, scenario, data, max(1, int(args.warmup * scenario.share)), args.concurrency, rng)
+            result = await run_scenario(client, scenario, data, total, args.concurrency, rng)
+            routes[scenario.name] = result
+            print(
+                f"{scenario.name:<16} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}"
+            )
+
+    hashing.shutdown()
+    await database.read_router.dispose()
+    await database.read_engine.dispose()
+    await database.engine.dispose()
+    return {
+        "meta": {
+            "users": args.users,
+            "posts": args.posts,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "profile": args.profile,
+            "page_cache_size": args.page_cache_size,
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "routes": routes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reseed", action="store_true", help="rebuild the dataset even if it is cached")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per route before measuring")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--routes", type=lambda s: set(s.split(",")), help="comma-separated subset of routes")
+    parser.add_argument("--profile", choices=["production", "development"], default="production")
+    # With the page cache on, / and /html/posts/{id} only measure cache lookups after their
+    # first hit, so by default every request renders; pass a size to measure warm pages.
+    parser.add_argument("--page-cache-size", type=int, default=0, help="0 renders every page")
+    parser.add_argument("-o", "--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    args = parser.parse_args()
+    unknown = (args.routes or set()) - {s.name for s in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    # app reads its configuration at import time, so the environment is set before anything
+    # imports it (seeding uses an engine of its own).
+    path = dataset_path(args)
+    os.environ.update(
+        DATABASE_URL=f"sqlite+aiosqlite:///{path}",
+        APP_ENV=args.profile,
+        DB_PROFILE=args.profile,
+        DB_ECHO="0",
+        PAGE_CACHE_SIZE=str(args.page_cache_size),
+        # All clients share one address, so the login scenario would just measure 429s.
+        LOGIN_THROTTLE="0",
+    )
+    asyncio.run(ensure_dataset(args, path))
+    results = asyncio.run(run(args))
+
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"results written to {args.output}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+    elif args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ CREATE TABLE IF NOT EXISTS users (
   email         TEXT NOT NULL UNIQUE,
   login         TEXT NOT NULL UNIQUE,
   password_hash TEXT NOT NULL,
+  fanout_on_read BOOLEAN NOT NULL DEFAULT FALSE,
   created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   updated_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
@@ -12,22 +13,28 @@ CREATE TABLE IF NOT EXISTS posts (
   author_id   BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
   title       TEXT NOT NULL,
   content     TEXT NOT NULL,
+  favorite_count INTEGER NOT NULL DEFAULT 0,
+  comment_count  INTEGER NOT NULL DEFAULT 0,
   created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
-CREATE INDEX IF NOT EXISTS idx_posts_author_id ON posts(author_id);
+CREATE INDEX IF NOT EXISTS idx_posts_author_id_created_at ON posts(author_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_posts_created_at_id ON posts(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_posts_favorite_count_id ON posts(favorite_count DESC, id DESC);
 
 CREATE TABLE IF NOT EXISTS tags (
-  id    BIGSERIAL PRIMARY KEY,
-  name  TEXT NOT NULL UNIQUE
+  id         BIGSERIAL PRIMARY KEY,
+  name       TEXT NOT NULL UNIQUE,
+  post_count INTEGER NOT NULL DEFAULT 0
 );
+CREATE INDEX IF NOT EXISTS idx_tags_post_count ON tags(post_count DESC, name);
 
 CREATE TABLE IF NOT EXISTS post_tags (
   post_id BIGINT NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
   tag_id  BIGINT NOT NULL REFERENCES tags(id)  ON DELETE CASCADE,
   PRIMARY KEY (post_id, tag_id)
 );
-CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON post_tags(tag_id);
+CREATE INDEX IF NOT EXISTS idx_post_tags_tag ON post_tags(tag_id, post_id);
 
 CREATE TABLE IF NOT EXISTS favorites (
   user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
@@ -45,7 +52,7 @@ CREATE TABLE IF NOT EXISTS comments (
   created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
   updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
-CREATE INDEX IF NOT EXISTS idx_comments_post ON comments(post_id);
+CREATE INDEX IF NOT EXISTS idx_comments_post ON comments(post_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_comments_author ON comments(author_id);
 
 CREATE TABLE IF NOT EXISTS subscriptions (
@@ -57,3 +64,22 @@ CREATE TABLE IF NOT EXISTS subscriptions (
 );
 CREATE INDEX IF NOT EXISTS idx_subscriptions_followee ON subscriptions(followee_id);
 
+CREATE TABLE IF NOT EXISTS timeline (
+  user_id    BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  post_id    BIGINT NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+  created_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (user_id, post_id)
+);
+CREATE INDEX IF NOT EXISTS idx_timeline_user_created_at ON timeline(user_id, created_at DESC, post_id DESC);
+
+CREATE TABLE IF NOT EXISTS outbox (
+  id           BIGSERIAL PRIMARY KEY,
+  kind         VARCHAR(50) NOT NULL,
+  payload      JSONB NOT NULL,
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  attempts     INT NOT NULL DEFAULT 0,
+  last_error   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_available_at ON outbox(available_at, id);
+
@@ -0,0 +1,24 @@
+"""Composite index for keyset pagination of posts
+
+Revision ID: 7c1e4b9d2a6f
+Revises: 3221c9a81a30
+Create Date: 2026-10-18 10:02:11.417305
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "7c1e4b9d2a6f"
+down_revision: str | None = "3221c9a81a30"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_posts_created_at_id", "posts", ["created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_posts_created_at_id", table_name="posts")
@@ -0,0 +1,34 @@
+"""Denormalized favorite count on posts
+
+Revision ID: a3f7c2d91e08
+Revises: e94a0c3b7d15
+Create Date: 2026-10-18 14:05:12.402871
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "a3f7c2d91e08"
+down_revision: str | None = "e94a0c3b7d15"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("posts", sa.Column("favorite_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute("UPDATE posts SET favorite_count = (SELECT count(*) FROM favorites WHERE favorites.post_id = posts.id)")
+    op.create_index(
+        "ix_posts_favorite_count_id",
+        "posts",
+        [sa.text("favorite_count DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_posts_favorite_count_id", table_name="posts")
+    with op.batch_alter_table("posts") as batch_op:
+        batch_op.drop_column("favorite_count")
@@ -0,0 +1,46 @@
+"""Full-text search index for posts
+
+Revision ID: b5d8e2f14c37
+Revises: 7c1e4b9d2a6f
+Create Date: 2026-10-18 11:24:53.902114
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+revision: str = "b5d8e2f14c37"
+down_revision: str | None = "7c1e4b9d2a6f"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Frozen copies of the DDL in app/search.py as of this revision.
+SQLITE_FTS_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, tokenize='unicode61')"
+SQLITE_FTS_DROP = "DROP TABLE IF EXISTS posts_fts"
+POSTGRES_FTS_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_posts_search ON posts USING GIN (to_tsvector('simple', title || ' ' || content))"
+)
+POSTGRES_FTS_DROP = "DROP INDEX IF EXISTS ix_posts_search"
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(SQLITE_FTS_DDL)
+        # \x02/\x03 mark search hits in snippets, so they are kept out of the index.
+        op.execute(
+            "INSERT INTO posts_fts (rowid, title, content) SELECT id, "
+            "replace(replace(title, char(2), ''), char(3), ''), "
+            "replace(replace(content, char(2), ''), char(3), '') FROM posts"
+        )
+    elif dialect == "postgresql":
+        op.execute(POSTGRES_FTS_DDL)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(SQLITE_FTS_DROP)
+    elif dialect == "postgresql":
+        op.execute(POSTGRES_FTS_DROP)
@@ -0,0 +1,51 @@
+"""Timeline table for the following feed
+
+Revision ID: c81d4f6a2b39
+Revises: a3f7c2d91e08
+Create Date: 2026-10-18 15:22:48.913604
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "c81d4f6a2b39"
+down_revision: str | None = "a3f7c2d91e08"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "timeline",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "post_id"),
+    )
+    op.create_index(
+        "ix_timeline_user_id_created_at",
+        "timeline",
+        ["user_id", sa.text("created_at DESC"), sa.text("post_id DESC")],
+        unique=False,
+    )
+    op.create_index("ix_subscriptions_followee_id", "subscriptions", ["followee_id"], unique=False)
+    op.add_column("users", sa.Column("fanout_on_read", sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Existing subscriptions predate fan-out; give every follower their followees' posts.
+    op.execute(
+        "INSERT INTO timeline (user_id, post_id, created_at) "
+        "SELECT s.follower_id, p.id, p.created_at FROM subscriptions s JOIN posts p ON p.author_id = s.followee_id"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("fanout_on_read")
+    op.drop_index("ix_subscriptions_followee_id", table_name="subscriptions")
+    op.drop_index("ix_timeline_user_id_created_at", table_name="timeline")
+    op.drop_table("timeline")
@@ -0,0 +1,31 @@
+"""Tag post counts and a post_tags(tag_id) index
+
+Revision ID: d47b9e1c5a20
+Revises: c81d4f6a2b39
+Create Date: 2026-10-18 16:48:03.551290
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "d47b9e1c5a20"
+down_revision: str | None = "c81d4f6a2b39"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_post_tags_tag_id", "post_tags", ["tag_id", "post_id"], unique=False)
+    op.add_column("tags", sa.Column("post_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute("UPDATE tags SET post_count = (SELECT count(*) FROM post_tags WHERE post_tags.tag_id = tags.id)")
+    op.create_index("ix_tags_post_count", "tags", [sa.text("post_count DESC"), "name"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tags_post_count", table_name="tags")
+    with op.batch_alter_table("tags") as batch_op:
+        batch_op.drop_column("post_count")
+    op.drop_index("ix_post_tags_tag_id", table_name="post_tags")
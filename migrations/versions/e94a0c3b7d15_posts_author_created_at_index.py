@@ -0,0 +1,30 @@
+"""Composite index for per-author post listings
+
+Revision ID: e94a0c3b7d15
+Revises: b5d8e2f14c37
+Create Date: 2026-10-18 12:40:37.118562
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "e94a0c3b7d15"
+down_revision: str | None = "b5d8e2f14c37"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_posts_author_id_created_at",
+        "posts",
+        ["author_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_posts_author_id_created_at", table_name="posts")
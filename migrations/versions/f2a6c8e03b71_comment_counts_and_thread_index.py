@@ -0,0 +1,31 @@
+"""Post comment counts and a comments(post_id, created_at, id) index
+
+Revision ID: f2a6c8e03b71
+Revises: d47b9e1c5a20
+Create Date: 2026-10-18 18:12:40.219734
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "f2a6c8e03b71"
+down_revision: str | None = "d47b9e1c5a20"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("posts", sa.Column("comment_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute("UPDATE posts SET comment_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id)")
+    op.create_index("ix_comments_post_id_created_at", "comments", ["post_id", "created_at", "id"], unique=False)
+    op.create_index("ix_comments_author_id", "comments", ["author_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_comments_author_id", table_name="comments")
+    op.drop_index("ix_comments_post_id_created_at", table_name="comments")
+    with op.batch_alter_table("posts") as batch_op:
+        batch_op.drop_column("comment_count")
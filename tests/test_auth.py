@@ -1,5 +1,13 @@
 import pytest
+from conftest import TestingSessionLocal, override_get_db
 from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.cache import user_cache
+from app.database import get_db, get_read_db
+from app.main import app
+from app.security import hashing
+from app.tables import Base
 
 
 @pytest.mark.asyncio
@@ -36,3 +44,101 @@ async def test_create_post_unauthorized(client: AsyncClient):
     )
     assert response.status_code == 303
     assert "/login" in response.headers["location"]
+
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_and_invalidated_on_update(client: AsyncClient):
+    await client.post(
+        "/register",
+        data={"email": "cache@example.com", "login": "cacheuser", "password": "password123"},
+    )
+    response = await client.post("/login", data={"login": "cacheuser", "password": "password123"})
+    cookies = {"access_token": response.cookies["access_token"]}
+
+    await client.get("/", cookies=cookies)
+    response = await client.get("/", cookies=cookies)
+    assert "Hello, cacheuser" in response.text
+    assert user_cache.stats()["hits"] == 1
+    assert user_cache.stats()["misses"] == 1
+
+    await client.post("/profile", data={"email": "cache@example.com", "login": "renamed"}, cookies=cookies)
+    response = await client.get("/", cookies=cookies)
+    assert "Hello, renamed" in response.text
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_on_the_worker_pool(client: AsyncClient):
+    completed = hashing.stats()["completed"]
+    await client.post(
+        "/register",
+        data={"email": "pool@example.com", "login": "pooluser", "password": "password123"},
+    )
+    response = await client.post("/login", data={"login": "pooluser", "password": "wrong-password"})
+    assert response.status_code == 400
+    assert hashing.stats()["completed"] == completed + 2
+    assert hashing.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_profile_update_releases_the_write_session_before_streaming(client: AsyncClient):
+    await client.post("/register", data={"email": "w@example.com", "login": "writer", "password": "password123"})
+    await client.post("/register", data={"email": "x@example.com", "login": "taken", "password": "password123"})
+    response = await client.post("/login", data={"login": "writer", "password": "password123"})
+    cookies = {"access_token": response.cookies["access_token"]}
+
+    log: list[str] = []
+
+    async def tracked_get_db():
+        async with TestingSessionLocal() as session:
+            for name in ("execute", "stream", "scalars"):
+                method = getattr(session, name)
+
+                async def traced(*args, _method=method, **kwargs):
+                    log.append("write")
+                    return await _method(*args, **kwargs)
+
+                setattr(session, name, traced)
+            close = session.close
+
+            async def traced_close():
+                log.append("closed")
+                await close()
+
+            session.close = traced_close
+            yield session
+
+    app.dependency_overrides[get_db] = tracked_get_db
+    try:
+        ok = await client.post("/profile", data={"email": "w@example.com", "login": "writer2"}, cookies=cookies)
+        failed = await client.post("/profile", data={"email": "w@example.com", "login": "taken"}, cookies=cookies)
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+
+    assert ok.status_code == 200 and "Profile updated successfully!" in ok.text
+    assert failed.status_code == 400 and "writer2" in failed.text
+    # Each request wrote, then closed the write session; nothing ran on it afterwards.
+    first_close = log.index("closed")
+    assert "write" in log[:first_close] and "write" not in log[first_close + 1 : log.index("closed", first_close + 1)]
+
+
+@pytest.mark.asyncio
+async def test_login_checks_credentials_on_the_primary(client: AsyncClient):
+    # A replica that hasn't caught up with the registration yet.
+    replica = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def lagging_read_db():
+        async with AsyncSession(replica) as session:
+            yield session
+
+    app.dependency_overrides[get_read_db] = lagging_read_db
+    try:
+        await client.post("/register", data={"email": "new@example.com", "login": "newbie", "password": "password123"})
+        response = await client.post("/login", data={"login": "newbie", "password": "password123"})
+    finally:
+        app.dependency_overrides[get_read_db] = override_get_db
+        await replica.dispose()
+
+    assert response.status_code == 303
+    assert "access_token" in response.cookies
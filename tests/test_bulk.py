@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+
+import orjson
+import pytest
+from conftest import TestingSessionLocal
+from httpx import AsyncClient
+
+from app import bulk, storage
+from app.models import UserCreate
+
+
+def ndjson(*records) -> bytes:
+    return b"".join(orjson.dumps(r) + b"\n" for r in records)
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_users_and_posts(client: AsyncClient):
+    body = ndjson(
+        {"email": "a@example.com", "login": "alice", "password": "secret1"},
+        {"email": "b@example.com", "login": "bob", "password": "secret2"},
+        {"email": "c@example.com", "login": "alice", "password": "secret3"},
+        {"email": "not-an-email", "login": "carol", "password": "secret4"},
+    )
+    r = await client.post("/bulk/users", content=body)
+    assert r.status_code == 200
+    report = r.json()
+    assert report["inserted"] == 2
+    assert report["rejected"] == 2
+    assert [e["line"] for e in report["errors"]] == [4, 3]
+    assert "rowsPerSecond" in report
+
+    r = await client.post("/login", data={"login": "bob", "password": "secret2"}, follow_redirects=False)
+    assert r.status_code == 303
+
+    users = {u["login"]: u["id"] for u in (await client.get("/users/")).json()}
+    body = ndjson(*({"authorId": users["alice"], "title": f"Imported {i}", "content": "bulk"} for i in range(5)))
+    body += b"{broken\n" + ndjson({"authorId": 999, "title": "Orphan", "content": "x"})
+    r = await client.post("/bulk/posts", content=body)
+    report = r.json()
+    assert report["inserted"] == 5
+    assert report["errors"] == [
+        {"line": 6, "error": "invalid JSON"},
+        {"line": 7, "error": "author does not exist"},
+    ]
+
+    r = await client.get("/posts/", params={"authorId": users["alice"]})
+    assert len(r.json()["items"]) == 5
+
+    body = ndjson(
+        *({"authorId": users["bob"], "title": f"Tagged {i}", "content": "x", "tags": [f"t{i}"]} for i in range(3))
+    )
+    assert (await client.post("/bulk/posts", content=body)).json()["inserted"] == 3
+    r = await client.get("/posts/", params={"tag": "t1"})
+    assert [p["title"] for p in r.json()["items"]] == ["Tagged 1"]
+    r = await client.get("/", params={"q": "imported"})
+    assert r.text.count("Imported") == 5
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_users_registered_during_the_import(client: AsyncClient, monkeypatch):
+    hash_password = bulk.hashing.hash
+    registered = False
+
+    async def hash_while_someone_registers(password: str) -> str:
+        # The chunk has been checked for duplicates but not inserted yet.
+        nonlocal registered
+        if not registered:
+            registered = True
+            async with TestingSessionLocal() as session:
+                await storage.create_user(
+                    session, UserCreate(email="late@example.com", login="late", password="secret1")
+                )
+        return await hash_password(password)
+
+    monkeypatch.setattr(bulk.hashing, "hash", hash_while_someone_registers)
+    body = ndjson(
+        {"email": "early@example.com", "login": "early", "password": "secret1"},
+        {"email": "late@example.com", "login": "late2", "password": "secret2"},
+        {"email": "other@example.com", "login": "other", "password": "secret3"},
+    )
+    r = await client.post("/bulk/users", content=body)
+    assert r.status_code == 200
+    report = r.json()
+    assert report["inserted"] == 2
+    assert report["errors"] == [{"line": 2, "error": "email or login already exists"}]
+    logins = {u["login"] for u in (await client.get("/users/")).json()}
+    assert logins == {"early", "late", "other"}
+
+
+@pytest.mark.asyncio
+async def test_bulk_export_ndjson_and_csv(client: AsyncClient):
+    r = await client.post("/users/", json={"email": "x@example.com", "login": "exporter", "password": "secret"})
+    author_id = r.json()["id"]
+    for i in range(3):
+        await client.post("/posts/", json={"authorId": author_id, "title": f"Post, {i}", "content": "line\nbreak"})
+
+    r = await client.get("/bulk/posts")
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="posts.ndjson"' in r.headers["content-disposition"]
+    posts = [json.loads(line) for line in r.text.splitlines()]
+    assert {p["title"] for p in posts} == {"Post, 0", "Post, 1", "Post, 2"}
+
+    r = await client.get("/bulk/posts", params={"format": "csv"})
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 3
+    assert rows[0]["content"] == "line\nbreak"
+
+    r = await client.get("/bulk/users", params={"format": "csv"})
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [row["login"] for row in rows] == ["exporter"]
+    assert "password_hash" not in rows[0]
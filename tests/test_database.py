@@ -0,0 +1,146 @@
+import pytest
+from conftest import TestingSessionLocal, override_get_db
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import storage, tables
+from app.cache import page_cache
+from app.database import ReadRouter, Replica, get_read_db, make_engine, read_router
+from app.main import app
+from app.models import CommentCreate, PostUpdate, UserCreate
+
+
+@pytest.mark.asyncio
+async def test_production_profile_tunes_sqlite_and_splits_reads(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'prod.db'}"
+    writer = make_engine(url, profile="production")
+    reader = make_engine(url, read_only=True, profile="production")
+    try:
+        assert writer.pool.size() == 1
+        async with writer.begin() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            await conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            await conn.execute(text("INSERT INTO t VALUES (1)"))
+
+        async with reader.connect() as conn:
+            assert (await conn.execute(text("SELECT x FROM t"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+            with pytest.raises(OperationalError):
+                await conn.execute(text("INSERT INTO t VALUES (2)"))
+    finally:
+        await reader.dispose()
+        await writer.dispose()
+
+
+async def _replica_with_marker(url: str, marker: str) -> None:
+    engine = make_engine(url)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE origin (name TEXT)"))
+        await conn.execute(text("INSERT INTO origin VALUES (:name)"), {"name": marker})
+    await engine.dispose()
+
+
+async def _origin(router: ReadRouter, user_id: int | None = None) -> str:
+    async with await router.open_session(user_id) as session:
+        return (await session.execute(text("SELECT name FROM origin"))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_read_router_round_robin_failover_and_stickiness(tmp_path):
+    urls = {name: f"sqlite+aiosqlite:///{tmp_path / f'{name}.db'}" for name in ("primary", "replica1", "replica2")}
+    for name, url in urls.items():
+        await _replica_with_marker(url, name)
+    primary_engine = make_engine(urls["primary"])
+    primary = async_sessionmaker(bind=primary_engine, class_=AsyncSession)
+
+    router = ReadRouter(primary, [urls["replica1"], urls["replica2"]], retry_after=60, sticky_for=60)
+    try:
+        assert [await _origin(router) for _ in range(4)] == ["replica1", "replica2", "replica1", "replica2"]
+
+        # A user who just wrote reads from the primary; everyone else keeps using replicas.
+        router.note_write(7)
+        assert await _origin(router, 7) == "primary"
+        assert await _origin(router, 8) == "replica1"
+
+        # An unreachable replica is skipped and left alone until its retry time.
+        router.replicas[1].sessionmaker.configure(bind=make_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/x.db"))
+        assert await _origin(router) == "replica1"
+        assert router.replicas[1].down_until > 0
+        assert [await _origin(router) for _ in range(2)] == ["replica1", "replica1"]
+
+        router.replicas[0].down_until = float("inf")
+        assert await _origin(router) == "primary"
+    finally:
+        await router.dispose()
+        await primary_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_writes_pin_the_author_to_the_primary(client, monkeypatch):
+    monkeypatch.setattr(read_router, "replicas", [object()])
+    monkeypatch.setattr(read_router, "_sticky", {})
+
+    r = await client.post("/users/", json={"email": "w@example.com", "login": "writer", "password": "password123"})
+    user_id = r.json()["id"]
+    assert not read_router.is_sticky(user_id)
+
+    r = await client.post("/posts/", json={"authorId": user_id, "title": "T", "content": "C"})
+    assert r.status_code == 201
+    assert read_router.is_sticky(user_id)
+    post_id = r.json()["id"]
+
+    async with TestingSessionLocal() as session:
+        reader = (
+            await storage.create_user(session, UserCreate(email="r@example.com", login="reader", password="secret1"))
+        ).id
+        writes = [
+            lambda: storage.update_post(session, post_id, PostUpdate(title="T2")),
+            lambda: storage.add_favorite(session, reader, post_id),
+            lambda: storage.remove_favorite(session, reader, post_id),
+            lambda: storage.create_comment(session, post_id, CommentCreate(author_id=reader, content="hi")),
+            lambda: storage.follow_user(session, reader, user_id),
+            lambda: storage.unfollow_user(session, reader, user_id),
+        ]
+        for write, actor in zip(writes, [user_id] + [reader] * 5, strict=True):
+            read_router._sticky.clear()
+            await write()
+            assert read_router.is_sticky(actor)
+
+
+@pytest.mark.asyncio
+async def test_an_edited_post_is_read_back_from_the_primary(client, monkeypatch, tmp_path):
+    await client.post("/register", data={"email": "e@example.com", "login": "editor", "password": "password123"})
+    response = await client.post("/login", data={"login": "editor", "password": "password123"})
+    cookies = {"access_token": response.cookies["access_token"]}
+    response = await client.post("/html/posts/new", data={"title": "Draft", "content": "C"}, cookies=cookies)
+    location = response.headers["location"]
+
+    # A replica frozen at this point: it never sees the edit below.
+    replica = Replica(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica.engine.begin() as conn, TestingSessionLocal() as primary:
+        await conn.run_sync(tables.Base.metadata.create_all)
+        for table in (tables.User.__table__, tables.Post.__table__):
+            rows = (await primary.execute(select(table))).mappings().all()
+            await conn.execute(insert(table), [dict(row) for row in rows])
+
+    monkeypatch.setattr(read_router, "primary", TestingSessionLocal)
+    monkeypatch.setattr(read_router, "replicas", [replica])
+    monkeypatch.setattr(read_router, "_sticky", {})
+    monkeypatch.setattr(page_cache, "replica_lag", 60.0)
+    del app.dependency_overrides[get_read_db]
+    try:
+        response = await client.post(
+            f"{location}/edit", data={"title": "Final", "content": "C"}, cookies=cookies, follow_redirects=False
+        )
+        assert response.status_code == 303
+        assert "Final" in (await client.get(response.headers["location"], cookies=cookies)).text
+        # Everyone else still reads the lagging replica, but that page isn't cached.
+        client.cookies.clear()
+        assert "Draft" in (await client.get(location)).text
+        assert "Draft" in (await client.get("/")).text
+        assert page_cache.stats()["size"] == 0
+    finally:
+        app.dependency_overrides[get_read_db] = override_get_db
+        await replica.engine.dispose()
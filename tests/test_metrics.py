@@ -0,0 +1,75 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from app import metrics
+from app.database import make_engine
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_routes_sql_and_templates(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "m@example.com", "login": "metric", "password": "secret"})
+    author_id = resp.json()["id"]
+    post_id = (await client.post("/posts/", json={"authorId": author_id, "title": "T", "content": "C"})).json()["id"]
+
+    route = "/html/posts/{post_id}"
+    requests_before = metrics.http_requests.value("GET", route, "200")
+    statements_before = metrics.request_statements.sum(route)
+    renders_before = metrics.template_render.count("post_detail.html")
+    for _ in range(2):
+        assert (await client.get(f"/html/posts/{post_id}")).status_code == 200
+    await client.get("/no/such/page")
+
+    assert metrics.http_requests.value("GET", route, "200") == requests_before + 2
+    assert metrics.http_requests.value("GET", "<unmatched>", "404") >= 1
+    # The first view queries the database and renders; the second is served from the page cache.
+    assert metrics.request_statements.sum(route) - statements_before >= 4
+    assert metrics.template_render.count("post_detail.html") == renders_before + 1
+    assert metrics.http_in_flight.value("GET") == 0
+
+    resp = await client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = resp.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}"}}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/html/posts/{post_id}",le="+Inf"}' in body
+    assert 'db_statement_duration_seconds_count{operation="SELECT"}' in body
+    assert f"/html/posts/{post_id}" not in body
+    assert "user_cache_entries " in body
+    assert 'user_cache_lookups{result="hit"}' in body and 'user_cache_lookups{result="miss"}' in body
+    assert 'password_hashing_tasks{state="queued"} 0' in body
+    assert "password_hashing_completed " in body and "password_hashing_queue_peak " in body
+
+
+@pytest.mark.asyncio
+async def test_queue_pool_records_checkout_wait(tmp_path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", read_only=True, profile="production")
+    before = metrics.pool_wait.count("read")
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+    assert metrics.pool_wait.count("read") == before + 1
+
+
+def test_exposition_format():
+    registry = metrics.Registry()
+    hits = registry.counter("hits_total", "Hits", ("path",))
+    hits.inc('a"b')
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    assert registry.render().splitlines() == [
+        "# HELP hits_total Hits",
+        "# TYPE hits_total counter",
+        'hits_total{path="a\\"b"} 1',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.55",
+        "latency_seconds_count 3",
+    ]
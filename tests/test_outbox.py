@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from conftest import TestingSessionLocal
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql
+
+from app import outbox, storage, tables
+from app.models import PostCreate, UserCreate
+
+
+async def queued(session) -> list[tables.OutboxEvent]:
+    session.expire_all()
+    return list((await session.execute(select(tables.OutboxEvent).order_by(tables.OutboxEvent.id))).scalars())
+
+
+async def make_due(session) -> None:
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await session.execute(update(tables.OutboxEvent).values(available_at=past))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_back_off_and_retry(client, monkeypatch):
+    calls = []
+
+    async def flaky(session, payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    monkeypatch.setitem(outbox.handlers, "test.flaky", flaky)
+    failures_before = outbox.failures.value("test.flaky")
+    async with TestingSessionLocal() as session:
+        await outbox.enqueue(session, "test.flaky", [{"n": 1}, {"n": 2}])
+        await session.commit()
+
+        assert await outbox.drain(TestingSessionLocal) == 0
+        events = await queued(session)
+        assert [e.attempts for e in events] == [1, 1]
+        assert events[0].last_error == "RuntimeError: boom"
+        assert outbox.failures.value("test.flaky") == failures_before + 2
+        assert outbox.pending.value() == 2
+        # Not due again until the backoff has passed.
+        assert await outbox.drain(TestingSessionLocal) == 0 and len(calls) == 1
+
+        await make_due(session)
+        assert await outbox.drain(TestingSessionLocal) == 2
+        assert calls[-1] == [{"n": 1}, {"n": 2}]
+        assert await queued(session) == []
+        assert outbox.pending.value() == 0
+        assert outbox.lag.count("test.flaky") >= 2
+
+
+@pytest.mark.asyncio
+async def test_claimed_events_survive_a_dead_worker_and_give_up_eventually(client, monkeypatch):
+    handled = []
+
+    async def record(session, payloads):
+        handled.extend(payloads)
+
+    monkeypatch.setitem(outbox.handlers, "test.record", record)
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    async with TestingSessionLocal() as session:
+        await outbox.enqueue(session, "test.record", [{"n": 1}])
+        await outbox.enqueue(session, "test.unknown", [{"n": 2}])
+        await session.commit()
+
+        # A worker claims the batch and dies: the events stay leased, then come back.
+        assert len(await outbox._claim(session, 10)) == 2
+        assert await outbox.drain(TestingSessionLocal) == 0
+        await make_due(session)
+        assert await outbox.drain(TestingSessionLocal) == 1
+        assert handled == [{"n": 1}]
+
+        # No handler: it fails until it runs out of attempts and is left for inspection.
+        await make_due(session)
+        await outbox.drain(TestingSessionLocal)
+        [event] = await queued(session)
+        assert event.kind == "test.unknown" and event.attempts == 2
+        await make_due(session)
+        assert await outbox.drain(TestingSessionLocal) == 0
+        assert outbox.dead.value() == 1 and outbox.pending.value() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_fans_out_new_posts_after_commit(client):
+    async with TestingSessionLocal() as session:
+        author = await storage.create_user(
+            session, UserCreate(email="a@example.com", login="author", password="secret1")
+        )
+        reader = await storage.create_user(
+            session, UserCreate(email="r@example.com", login="reader", password="secret1")
+        )
+        await storage.follow_user(session, reader.id, author.id)
+
+        outbox.worker.start(TestingSessionLocal)
+        try:
+            post = await storage.create_post(session, PostCreate(author_id=author.id, title="T", content="C"))
+            for _ in range(100):
+                page = await storage.list_feed(session, reader.id)
+                if page.items:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.worker.stop()
+
+        assert [p.id for p in page.items] == [post.id]
+        assert (await session.execute(select(func.count()).select_from(tables.OutboxEvent))).scalar_one() == 0
+
+
+def test_claims_skip_rows_another_worker_has_locked_on_postgres():
+    stmt = outbox._claim_statement(10, datetime.now(timezone.utc))
+    assert "LIMIT %(param_1)s FOR UPDATE SKIP LOCKED)" in str(stmt.compile(dialect=postgresql.dialect()))
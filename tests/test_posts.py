@@ -1,5 +1,48 @@
+import asyncio
+import json
+
 import pytest
+from conftest import TestingSessionLocal
 from httpx import AsyncClient
+from sqlalchemy import update
+
+from app import outbox, storage, tables
+from app.cache import PageCache, page_cache
+from app.main import app
+
+
+async def asgi_body_chunks(path: str) -> list[bytes]:
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    chunks: list[bytes] = []
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    return chunks
 
 
 async def get_auth_cookie(client: AsyncClient, login: str, password: str):
@@ -83,3 +126,393 @@ async def test_favorites(client: AsyncClient):
     assert resp.status_code == 303
 
     resp = await client.get("/profile", cookies=cookies)
+
+
+@pytest.mark.asyncio
+async def test_list_posts_cursor_pagination(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "pager@example.com", "login": "pager", "password": "secret"})
+    author_id = resp.json()["id"]
+    for i in range(25):
+        resp = await client.post("/posts/", json={"authorId": author_id, "title": f"Post {i}", "content": "..."})
+        assert resp.status_code == 201
+
+    seen: list[int] = []
+    cursor = None
+    while True:
+        params = {"limit": 10} if cursor is None else {"limit": 10, "cursor": cursor}
+        resp = await client.get("/posts/", params=params)
+        assert resp.status_code == 200
+        body = resp.json()
+        seen.extend(p["id"] for p in body["items"])
+        cursor = body["nextCursor"]
+        if cursor is None:
+            break
+
+    # Posts created within the same second tie on created_at, so the id tiebreaker
+    # must keep pages disjoint and in order.
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 25
+
+    resp = await client.get("/posts/", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_highlights_and_follows_updates(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "fts@example.com", "login": "ftsuser", "password": "secret"})
+    author_id = resp.json()["id"]
+    body_hit = await client.post(
+        "/posts/", json={"authorId": author_id, "title": "Weekend notes", "content": "Some <b>rust</b> tips"}
+    )
+    title_hit = await client.post(
+        "/posts/", json={"authorId": author_id, "title": "Rust ownership", "content": "Borrowing explained"}
+    )
+
+    response = await client.get("/?q=rust")
+    assert response.status_code == 200
+    text = response.text
+    assert text.index("Rust ownership") < text.index("Weekend notes")
+    assert "Some &lt;b&gt;<mark>rust</mark>&lt;/b&gt; tips" in text
+
+    await client.put(f"/posts/{body_hit.json()['id']}", json={"content": "Nothing relevant anymore"})
+    await client.put(f"/posts/{title_hit.json()['id']}", json={"title": "Go channels"})
+    response = await client.get("/?q=rust")
+    assert "Weekend notes" not in response.text
+    assert "Go channels" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_search_ignores_control_characters(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "ctl@example.com", "login": "ctluser", "password": "secret"})
+    author_id = resp.json()["id"]
+    await client.post(
+        "/posts/",
+        json={"authorId": author_id, "title": "Marker \x02test\x03", "content": "a \x02<b>\x03 rust \x03 b"},
+    )
+
+    response = await client.get("/?q=%00")
+    assert response.status_code == 200
+    response = await client.get("/?q=ru%00st%01")
+    assert response.status_code == 200
+
+    response = await client.get("/?q=rust")
+    assert response.status_code == 200
+    assert response.text.count("<mark>") == 1
+    assert "a &lt;b&gt; <mark>rust</mark>  b" in response.text
+
+
+@pytest.mark.asyncio
+async def test_index_shows_author_logins(client: AsyncClient):
+    ids = []
+    for login in ("alice", "bob", "carol"):
+        resp = await client.post(
+            "/users/", json={"email": f"{login}@example.com", "login": login, "password": "secret"}
+        )
+        ids.append(resp.json()["id"])
+    for author_id in ids[:2]:
+        await client.post("/posts/", json={"authorId": author_id, "title": f"By {author_id}", "content": "..."})
+
+    response = await client.get("/")
+    assert "by alice" in response.text
+    assert "by bob" in response.text
+    assert "carol" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_list_posts_filters_by_author(client: AsyncClient):
+    ids = []
+    for login in ("writer1", "writer2"):
+        resp = await client.post(
+            "/users/", json={"email": f"{login}@example.com", "login": login, "password": "secret"}
+        )
+        ids.append(resp.json()["id"])
+    for i in range(3):
+        for author_id in ids:
+            await client.post("/posts/", json={"authorId": author_id, "title": f"{author_id}-{i}", "content": "..."})
+
+    resp = await client.get("/posts/", params={"authorId": ids[0], "limit": 2})
+    body = resp.json()
+    assert [p["authorId"] for p in body["items"]] == [ids[0], ids[0]]
+
+    resp = await client.get("/posts/", params={"authorId": ids[0], "cursor": body["nextCursor"]})
+    body = resp.json()
+    assert [p["title"] for p in body["items"]] == [f"{ids[0]}-0"]
+    assert body["nextCursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_rendered_pages_are_cached_and_invalidated_by_writes(client: AsyncClient):
+    token = await get_auth_cookie(client, "cacheauthor", "secret")
+    cookies = {"access_token": token}
+    resp = await client.post(
+        "/html/posts/new", data={"title": "First", "content": "..."}, cookies=cookies, follow_redirects=False
+    )
+    post_id = resp.headers["location"].split("/")[-1]
+
+    await client.get("/")
+    hits = page_cache.stats()["hits"]
+    assert "First" in (await client.get("/")).text
+    assert page_cache.stats()["hits"] == hits + 1
+
+    await client.post("/html/posts/new", data={"title": "Second", "content": "..."}, cookies=cookies)
+    assert "Second" in (await client.get("/")).text
+
+    assert "Save to Favorites" in (await client.get(f"/html/posts/{post_id}", cookies=cookies)).text
+    await client.post(f"/favorites/{post_id}/add", cookies=cookies)
+    assert "Unsave" in (await client.get(f"/html/posts/{post_id}", cookies=cookies)).text
+
+    await client.post(f"/html/posts/{post_id}/edit", data={"title": "Edited", "content": "..."}, cookies=cookies)
+    client.cookies.clear()
+    anonymous = (await client.get(f"/html/posts/{post_id}")).text
+    assert "Edited" in anonymous
+    assert "Unsave" not in anonymous
+    assert "Edited" in (await client.get("/")).text
+
+
+def test_cached_pages_expire_for_workers_that_missed_the_write(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now)
+    cache = PageCache(maxsize=10, ttl=30, replica_lag=0)
+    cache.set(("index", None, 0), "<html>", {"posts"}, cache.generation)
+    assert cache.get(("index", None, 0)) == "<html>"
+    now += 31
+    assert cache.get(("index", None, 0)) is None
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_on_posts_and_users(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "etag@example.com", "login": "etaguser", "password": "secret"})
+    user_id = resp.json()["id"]
+    resp = await client.post("/posts/", json={"authorId": user_id, "title": "Cached", "content": "..."})
+    post_id = resp.json()["id"]
+
+    for url in (f"/posts/{post_id}", f"/users/{user_id}", f"/html/posts/{post_id}"):
+        resp = await client.get(url)
+        assert resp.status_code == 200
+        etag, last_modified = resp.headers["etag"], resp.headers["last-modified"]
+
+        resp = await client.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.headers["etag"] == etag
+        resp = await client.get(url, headers={"If-Modified-Since": last_modified})
+        assert resp.status_code == 304
+
+    etag = (await client.get(f"/posts/{post_id}")).headers["etag"]
+    await client.put(f"/posts/{post_id}", json={"title": "Changed"})
+    resp = await client.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["title"] == "Changed"
+    assert resp.headers["etag"] != etag
+
+    etag = (await client.get(f"/html/posts/{post_id}")).headers["etag"]
+    await client.put(f"/users/{user_id}", json={"login": "renamed"})
+    resp = await client.get(f"/html/posts/{post_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert "by renamed" in resp.text
+
+    resp = await client.post("/users/", json={"email": "c@example.com", "login": "commenter", "password": "secret"})
+    commenter_id = resp.json()["id"]
+    await client.post(f"/posts/{post_id}/comments", json={"authorId": commenter_id, "content": "hello"})
+    etag = (await client.get(f"/html/posts/{post_id}")).headers["etag"]
+    await client.put(f"/users/{commenter_id}", json={"login": "recommenter"})
+    resp = await client.get(f"/html/posts/{post_id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert "recommenter" in resp.text
+
+
+@pytest.mark.asyncio
+async def test_ndjson_streaming_listings(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "nd@example.com", "login": "nduser", "password": "secret"})
+    author_id = resp.json()["id"]
+    for i in range(5):
+        await client.post("/posts/", json={"authorId": author_id, "title": f"Row {i}", "content": "..."})
+
+    headers = {"Accept": "application/x-ndjson"}
+    resp = await client.get("/posts/", headers=headers)
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["title"] for r in rows] == [f"Row {i}" for i in reversed(range(5))]
+    assert rows[0] == (await client.get(f"/posts/{rows[0]['id']}")).json()
+
+    resp = await client.get("/users/", headers=headers)
+    users = [json.loads(line) for line in resp.text.splitlines()]
+    assert users == (await client.get("/users/")).json()
+    assert "password_hash" not in resp.text
+
+
+@pytest.mark.asyncio
+async def test_index_streams_chrome_before_posts(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "st@example.com", "login": "streamer", "password": "secret"})
+    author_id = resp.json()["id"]
+    for i in range(25):
+        await client.post("/posts/", json={"authorId": author_id, "title": f"Streamed {i}", "content": "..."})
+
+    # httpx's ASGI transport buffers the body, so drive the app directly to see the chunks.
+    chunks = await asgi_body_chunks("/")
+    assert len(chunks) > 1
+    assert b"</header>" in chunks[0]
+    assert b"Streamed" not in chunks[0]
+    page = b"".join(chunks).decode()
+    assert page.count("Streamed") == 20
+    assert "Older posts" in page
+    assert "<!-- flush -->" not in page
+
+
+@pytest.mark.asyncio
+async def test_favorite_counts_and_most_favorited(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "fc@example.com", "login": "counted", "password": "secret"})
+    author_id = resp.json()["id"]
+    ids = []
+    for i in range(3):
+        resp = await client.post("/posts/", json={"authorId": author_id, "title": f"Ranked {i}", "content": "..."})
+        ids.append(resp.json()["id"])
+
+    for login, saves in (("fan1", ids), ("fan2", ids[1:]), ("fan3", ids[2:])):
+        cookies = {"access_token": await get_auth_cookie(client, login, "secret")}
+        for post_id in saves:
+            await client.post(f"/favorites/{post_id}/add", cookies=cookies)
+        # Saving twice must not count twice.
+        await client.post(f"/favorites/{saves[0]}/add", cookies=cookies)
+
+    resp = await client.get("/posts/popular")
+    assert [(p["id"], p["favoriteCount"]) for p in resp.json()] == [(ids[2], 3), (ids[1], 2), (ids[0], 1)]
+
+    await client.post(f"/favorites/{ids[2]}/remove", cookies=cookies)
+    await client.post(f"/favorites/{ids[2]}/remove", cookies=cookies)
+    assert (await client.get(f"/posts/{ids[2]}")).json()["favoriteCount"] == 2
+
+    resp = await client.get("/popular")
+    assert resp.text.index("Ranked 1") < resp.text.index("Ranked 0")
+    assert "★ 2" in resp.text
+
+
+@pytest.mark.asyncio
+async def test_repair_favorite_counts(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "rp@example.com", "login": "repair", "password": "secret"})
+    resp = await client.post("/posts/", json={"authorId": resp.json()["id"], "title": "Drifted", "content": "..."})
+    post_id = resp.json()["id"]
+    cookies = {"access_token": await get_auth_cookie(client, "saver", "secret")}
+    await client.post(f"/favorites/{post_id}/add", cookies=cookies)
+
+    async with TestingSessionLocal() as session:
+        await session.execute(update(tables.Post).values(favorite_count=7))
+        await session.commit()
+        assert await storage.repair_favorite_counts(session) == 1
+        assert await storage.repair_favorite_counts(session) == 0
+
+    assert (await client.get(f"/posts/{post_id}")).json()["favoriteCount"] == 1
+
+
+@pytest.mark.asyncio
+async def test_follow_from_post_page_and_read_feed(client: AsyncClient):
+    author_cookies = {"access_token": await get_auth_cookie(client, "followed", "secret")}
+    await client.post("/html/posts/new", data={"title": "Worth following", "content": "..."}, cookies=author_cookies)
+    resp = await client.get("/posts/")
+    post = resp.json()["items"][0]
+
+    cookies = {"access_token": await get_auth_cookie(client, "follower", "secret")}
+    resp = await client.get(f"/html/posts/{post['id']}", cookies=cookies)
+    assert f'action="/follow/{post["authorId"]}"' in resp.text
+
+    resp = await client.post(f"/follow/{post['authorId']}", cookies=cookies, follow_redirects=False)
+    assert resp.status_code == 303
+    resp = await client.get(f"/html/posts/{post['id']}", cookies=cookies)
+    assert f'action="/unfollow/{post["authorId"]}"' in resp.text
+
+    await client.post(
+        "/html/posts/new", data={"title": "Fresh from followed", "content": "..."}, cookies=author_cookies
+    )
+    await outbox.drain(TestingSessionLocal)
+    resp = await client.get("/feed", cookies=cookies)
+    assert resp.text.index("Fresh from followed") < resp.text.index("Worth following")
+
+    await client.post(f"/unfollow/{post['authorId']}", cookies=cookies)
+    resp = await client.get("/feed", cookies=cookies)
+    assert "Worth following" not in resp.text
+
+
+@pytest.mark.asyncio
+async def test_tags_filter_cloud_and_retagging(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "tg@example.com", "login": "tagger", "password": "secret"})
+    author_id = resp.json()["id"]
+    ids = {}
+    for title, tags in (("both", ["Python", "sql"]), ("py only", ["python", " PYTHON "]), ("sql only", ["sql"])):
+        resp = await client.post("/posts/", json={"authorId": author_id, "title": title, "content": ".", "tags": tags})
+        ids[title] = resp.json()["id"]
+
+    def titles(resp):
+        return [p["title"] for p in resp.json()["items"]]
+
+    assert titles(await client.get("/posts/", params={"tag": "python"})) == ["py only", "both"]
+    assert titles(await client.get("/posts/", params=[("tag", "python"), ("tag", "SQL")])) == ["both"]
+    assert titles(await client.get("/posts/", params={"tag": "missing"})) == []
+
+    cloud = (await client.get("/tags/")).json()
+    assert cloud == [{"name": "python", "postCount": 2}, {"name": "sql", "postCount": 2}]
+
+    resp = await client.put(f"/posts/{ids['both']}", json={"tags": ["sql", "databases"]})
+    assert resp.status_code == 200
+    cloud = {t["name"]: t["postCount"] for t in (await client.get("/tags/")).json()}
+    assert cloud == {"sql": 2, "python": 1, "databases": 1}
+
+    resp = await client.get(f"/html/posts/{ids['both']}")
+    assert 'href="/html/tags/databases"' in resp.text
+    resp = await client.get("/html/tags/sql")
+    assert "both" in resp.text and "sql only" in resp.text and "py only" not in resp.text
+
+    async with TestingSessionLocal() as session:
+        await session.execute(update(tables.Tag).values(post_count=0))
+        await session.commit()
+        assert await storage.repair_tag_counts(session) == 3
+    assert len((await client.get("/tags/")).json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_tags_from_the_post_form(client: AsyncClient):
+    cookies = {"access_token": await get_auth_cookie(client, "formtagger", "secret")}
+    resp = await client.post(
+        "/html/posts/new",
+        data={"title": "Form tagged", "content": "...", "tags": "web, Jinja ,,web"},
+        cookies=cookies,
+        follow_redirects=False,
+    )
+    post_url = resp.headers["location"]
+    resp = await client.get(f"{post_url}/edit", cookies=cookies)
+    assert 'value="jinja, web"' in resp.text
+
+    await client.post(f"{post_url}/edit", data={"title": "Form tagged", "content": "...", "tags": ""}, cookies=cookies)
+    assert (await client.get("/tags/")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_comments_api_and_post_page(client: AsyncClient):
+    cookies = {"access_token": await get_auth_cookie(client, "commenter", "secret")}
+    resp = await client.post("/users/", json={"email": "ca@example.com", "login": "cauthor", "password": "secret"})
+    author_id = resp.json()["id"]
+    post_id = (await client.post("/posts/", json={"authorId": author_id, "title": "Talk", "content": "."})).json()["id"]
+
+    resp = await client.post(f"/posts/{post_id}/comments", json={"authorId": author_id, "content": "hello"})
+    assert resp.status_code == 201
+    assert resp.json()["authorLogin"] == "cauthor" and resp.json()["postId"] == post_id
+    assert (await client.post("/posts/999/comments", json={"authorId": author_id, "content": "x"})).status_code == 404
+    assert (await client.get("/posts/999/comments")).status_code == 404
+    assert (await client.get(f"/posts/{post_id}/comments", params={"cursor": "bogus"})).status_code == 400
+
+    # Warm the page cache so the comment form below has to invalidate it.
+    assert "Talk" in (await client.get("/")).text
+    resp = await client.post(
+        f"/html/posts/{post_id}/comments", data={"content": "from the form"}, cookies=cookies, follow_redirects=False
+    )
+    assert resp.status_code == 303
+
+    resp = await client.get(f"/posts/{post_id}/comments", params={"limit": 1})
+    page = resp.json()
+    assert [c["content"] for c in page["items"]] == ["hello"]
+    resp = await client.get(f"/posts/{post_id}/comments", params={"cursor": page["nextCursor"]})
+    assert [(c["content"], c["authorLogin"]) for c in resp.json()["items"]] == [("from the form", "commenter")]
+    assert resp.json()["nextCursor"] is None
+
+    assert (await client.get(f"/posts/{post_id}")).json()["commentCount"] == 2
+    assert "💬 2" in (await client.get("/")).text
+    resp = await client.get(f"/html/posts/{post_id}")
+    assert "Comments (2)" in resp.text and "from the form" in resp.text
@@ -0,0 +1,71 @@
+import pytest
+from conftest import TestingSessionLocal
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+
+from app.profiling import Profiler, ProfilerMiddleware, RequestProfile, profiler, query_budget, statement_shape
+
+
+def test_statement_shape_groups_repeats():
+    assert statement_shape("SELECT * FROM posts WHERE id = 12") == statement_shape("SELECT * FROM posts WHERE id = 7")
+    assert statement_shape("SELECT login FROM users WHERE id IN (?, ?,\n ?)") == (
+        "SELECT login FROM users WHERE id IN (?, ...)"
+    )
+    assert statement_shape("SELECT 'it''s' FROM t_1") == "SELECT ? FROM t_1"
+
+
+@pytest.mark.asyncio
+async def test_server_timing_and_n_plus_one_report(client: AsyncClient):
+    resp = await client.post("/users/", json={"email": "p@example.com", "login": "profiled", "password": "secret"})
+    author_id = resp.json()["id"]
+    post_id = (await client.post("/posts/", json={"authorId": author_id, "title": "T", "content": "C"})).json()["id"]
+
+    resp = await client.get(f"/html/posts/{post_id}")
+    timing = resp.headers["server-timing"]
+    assert timing.startswith("db;dur=") and "render;dur=" in timing and "total;dur=" in timing
+    profile = profiler.recent[-1]
+    assert profile.route == "/html/posts/{post_id}" and profile.budget == 7
+    assert 0 < len(profile.statements) <= profile.budget and profile.repeated == {}
+    assert profile.render_seconds > 0
+
+    # The same lookup once per row is what an N+1 looks like.
+    repeated = Profiler(threshold=3)
+    repeated.record(
+        RequestProfile(
+            "GET", "/x", 200, 0.1, 0.01, 0.0, [(f"SELECT * FROM users WHERE id = {i}", 0.001) for i in range(3)]
+        )
+    )
+    assert repeated.recent[-1].repeated == {"SELECT * FROM users WHERE id = ?": 3}
+
+
+@pytest.mark.asyncio
+async def test_query_budget_violations_are_recorded(client: AsyncClient):
+    @query_budget(1)
+    async def endpoint(scope, receive, send):
+        async with TestingSessionLocal() as session:
+            for _ in range(2):
+                await session.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    class Route:
+        path = "/budgeted"
+
+    Route.endpoint = endpoint
+
+    async def app(scope, receive, send):
+        scope["route"] = Route
+        await endpoint(scope, receive, send)
+
+    local = Profiler(enabled=True)
+    async with AsyncClient(transport=ASGITransport(app=ProfilerMiddleware(app, local)), base_url="http://t") as c:
+        resp = await c.get("/budgeted")
+    assert "server-timing" in resp.headers
+    assert [(p.route, len(p.statements), p.budget) for p in local.violations] == [("/budgeted", 2, 1)]
+
+
+def test_violations_are_bounded():
+    local = Profiler(enabled=True, keep=2)
+    for route in ("/a", "/b", "/c"):
+        local.record(RequestProfile("GET", route, 200, 0.0, 0.0, 0.0, [("SELECT 1", 0.0)] * 2, budget=1))
+    assert [p.route for p in local.violations] == ["/b", "/c"]
@@ -0,0 +1,146 @@
+import pytest
+from conftest import TestingSessionLocal
+from sqlalchemy import select
+
+from app import outbox, storage, tables
+from app.models import CommentCreate, PostCreate, PostUpdate, UserCreate, UserUpdate
+
+
+async def make_user(session, login: str) -> int:
+    user = await storage.create_user(session, UserCreate(email=f"{login}@example.com", login=login, password="secret1"))
+    return user.id
+
+
+@pytest.mark.asyncio
+async def test_write_path_query_counts(client, queries):
+    async with TestingSessionLocal() as session:
+        queries.reset()
+        user = await storage.create_user(session, UserCreate(email="q@example.com", login="quser", password="secret1"))
+        assert queries.count == 2  # duplicate check, INSERT ... RETURNING
+        assert user.id and user.created_at is not None
+
+        queries.reset()
+        post = await storage.create_post(session, PostCreate(author_id=user.id, title="T", content="C"))
+        assert queries.count == 3  # INSERT ... RETURNING, search index, fan-out outbox event
+        assert post.created_at is not None
+
+        queries.reset()
+        updated = await storage.update_user(session, user.id, UserUpdate(login="quser2"))
+        assert queries.count == 1
+        assert updated.login == "quser2"
+
+        queries.reset()
+        await storage.update_post(session, post.id, PostUpdate(title="T2"))
+        assert queries.count == 3  # UPDATE ... RETURNING, search index delete + insert
+
+        queries.reset()
+        await storage.add_favorite(session, user.id, post.id)
+        assert queries.count == 2  # INSERT ... ON CONFLICT, counter
+        queries.reset()
+        await storage.add_favorite(session, user.id, post.id)
+        assert queries.count == 1
+
+
+@pytest.mark.asyncio
+async def test_write_path_error_semantics(client, monkeypatch):
+    async with TestingSessionLocal() as session:
+        first = await make_user(session, "first")
+        await make_user(session, "second")
+
+        async def no_hashing(password: str) -> str:
+            raise AssertionError("a duplicate registration should not be hashed")
+
+        with monkeypatch.context() as m:
+            m.setattr(storage.hashing, "hash", no_hashing)
+            with pytest.raises(ValueError, match="email or login already exists"):
+                await make_user(session, "first")
+            with pytest.raises(ValueError, match="email or login already exists"):
+                await storage.create_user(
+                    session, UserCreate(email="new@example.com", login="second", password="secret1")
+                )
+        with pytest.raises(ValueError, match="email already exists"):
+            await storage.update_user(session, first, UserUpdate(email="second@example.com"))
+        with pytest.raises(ValueError, match="login already exists"):
+            await storage.update_user(session, first, UserUpdate(login="second"))
+        with pytest.raises(ValueError, match="user not found"):
+            await storage.update_user(session, 999, UserUpdate(login="nobody"))
+
+        with pytest.raises(ValueError, match="author does not exist"):
+            await storage.create_post(session, PostCreate(author_id=999, title="T", content="C"))
+        with pytest.raises(ValueError, match="post not found"):
+            await storage.update_post(session, 999, PostUpdate(title="T"))
+        with pytest.raises(ValueError, match="post not found"):
+            await storage.add_favorite(session, first, 999)
+
+        # The session stays usable after every rejected write.
+        assert (await storage.get_user(session, first)).login == "first"
+
+
+@pytest.mark.asyncio
+async def test_feed_fans_out_on_write_and_pulls_large_accounts(client, queries, monkeypatch):
+    monkeypatch.setattr(storage, "FANOUT_FOLLOWER_LIMIT", 2)
+    async with TestingSessionLocal() as session:
+        reader, other, small, big = [await make_user(session, name) for name in ("reader", "other", "small", "big")]
+        old = await storage.create_post(session, PostCreate(author_id=small, title="before follow", content="."))
+
+        await storage.follow_user(session, reader, small)
+        await storage.follow_user(session, reader, big)
+        assert not (await storage.get_user(session, big)).fanout_on_read
+        await storage.follow_user(session, other, big)
+        assert (await storage.get_user(session, big)).fanout_on_read
+
+        queries.reset()
+        await storage.create_post(session, PostCreate(author_id=small, title="pushed", content="."))
+        await storage.create_post(session, PostCreate(author_id=big, title="pulled", content="."))
+        assert (await session.execute(select(tables.TimelineEntry.post_id))).scalars().all() == [old.id]
+        assert await outbox.drain(TestingSessionLocal) == 3
+        pushed_rows = (await session.execute(select(tables.TimelineEntry.post_id))).scalars().all()
+        assert len(pushed_rows) == 2  # the backfilled post and "pushed"; "pulled" stays out
+
+        queries.reset()
+        page = await storage.list_feed(session, reader)
+        assert queries.count == 1
+        assert [p.title for p in page.items] == ["pulled", "pushed", "before follow"]
+
+        page = await storage.list_feed(session, reader, limit=2)
+        assert [p.title for p in page.items] == ["pulled", "pushed"]
+        page = await storage.list_feed(session, reader, cursor=page.next_cursor, limit=2)
+        assert [p.id for p in page.items] == [old.id] and page.next_cursor is None
+
+        await storage.unfollow_user(session, reader, small)
+        await storage.unfollow_user(session, reader, big)
+        assert (await storage.list_feed(session, reader)).items == []
+
+        with pytest.raises(ValueError, match="cannot follow yourself"):
+            await storage.follow_user(session, reader, reader)
+        with pytest.raises(ValueError, match="user not found"):
+            await storage.follow_user(session, reader, 999)
+
+
+@pytest.mark.asyncio
+async def test_comment_thread_queries_and_errors(client, queries):
+    async with TestingSessionLocal() as session:
+        author = await make_user(session, "poster")
+        readers = [await make_user(session, f"reader{i}") for i in range(3)]
+        post_id = (await storage.create_post(session, PostCreate(author_id=author, title="T", content="C"))).id
+
+        queries.reset()
+        await storage.create_comment(session, post_id, CommentCreate(author_id=readers[0], content="first"))
+        assert queries.count == 2  # INSERT ... RETURNING, counter
+        for i in range(1, 5):
+            await storage.create_comment(session, post_id, CommentCreate(author_id=readers[i % 3], content=f"c{i}"))
+
+        queries.reset()
+        page = await storage.list_comments(session, post_id, limit=3)
+        assert queries.count == 2  # page, author logins
+        assert [c.content for c in page.items] == ["first", "c1", "c2"]
+        assert page.logins == {readers[0]: "reader0", readers[1]: "reader1", readers[2]: "reader2"}
+        rest = await storage.list_comments(session, post_id, cursor=page.next_cursor, limit=3)
+        assert [c.content for c in rest.items] == ["c3", "c4"] and rest.next_cursor is None
+
+        with pytest.raises(ValueError, match="post not found"):
+            await storage.create_comment(session, 999, CommentCreate(author_id=author, content="x"))
+        with pytest.raises(ValueError, match="author does not exist"):
+            await storage.create_comment(session, post_id, CommentCreate(author_id=999, content="x"))
+        count = select(tables.Post.comment_count).where(tables.Post.id == post_id)
+        assert (await session.execute(count)).scalar_one() == 5
@@ -0,0 +1,71 @@
+import pytest
+from conftest import TestingSessionLocal, engine
+from sqlalchemy import func, select
+
+from app import storage, synthetic, tables
+from app.models import PostCreate, UserCreate
+
+SMALL = synthetic.Spec(users=40, posts=300, favorites=500, subscriptions=120, comments=200, tags=20, seed=7)
+
+
+async def snapshot(session) -> dict[str, list]:
+    return {
+        "posts": (await session.execute(select(tables.Post.author_id, tables.Post.title).order_by("id"))).all(),
+        "favorites": (await session.execute(select(tables.Favorite.user_id, tables.Favorite.post_id))).all(),
+        "subscriptions": (await session.execute(select(tables.Subscription.__table__))).all(),
+    }
+
+
+@pytest.mark.asyncio
+async def test_generate_is_consistent_and_deterministic(client):
+    async with TestingSessionLocal() as session:
+        report = await synthetic.generate(session, SMALL)
+        assert report.rows["users"] == 40 and report.rows["posts"] == 300
+        assert report.rows["favorites"] == 500 and report.rows["comments"] == 200
+        assert (await session.execute(select(func.count()).select_from(tables.Comment))).scalar_one() == 200
+        # Counters were written with the rows, so there is nothing to repair.
+        assert await storage.repair_favorite_counts(session) == 0
+        assert await storage.repair_comment_counts(session) == 0
+        assert await storage.repair_tag_counts(session) == 0
+        first = await snapshot(session)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(tables.Base.metadata.drop_all)
+        await conn.run_sync(tables.Base.metadata.create_all)
+    async with TestingSessionLocal() as session:
+        await synthetic.generate(session, SMALL)
+        assert await snapshot(session) == first
+
+
+@pytest.mark.asyncio
+async def test_generated_users_can_log_in_and_have_feeds(client):
+    async with TestingSessionLocal() as session:
+        await synthetic.generate(session, SMALL)
+        follower = (await session.execute(select(tables.Subscription.follower_id).limit(1))).scalar_one()
+        assert (await storage.list_feed(session, follower)).items
+
+    response = await client.post("/login", data={"login": f"user{follower}", "password": SMALL.password})
+    assert response.status_code == 303
+
+
+@pytest.mark.asyncio
+async def test_generate_appends_after_existing_rows(client):
+    spec = synthetic.Spec(users=5, posts=10, favorites=10, subscriptions=5, comments=5, tags=0)
+    async with TestingSessionLocal() as session:
+        await synthetic.generate(session, spec)
+        await synthetic.generate(session, spec)
+        assert (await session.execute(select(func.count()).select_from(tables.User))).scalar_one() == 10
+        assert (await session.execute(select(func.count()).select_from(tables.Post))).scalar_one() == 20
+
+        # Regular writes get fresh ids after the generated ones.
+        user = await storage.create_user(
+            session, UserCreate(email="new@example.com", login="newuser", password="secret1")
+        )
+        assert user.id == 11
+        assert (await storage.create_post(session, PostCreate(author_id=user.id, title="T", content="C"))).id == 21
+
+    sql = str(synthetic._advance_sequence(tables.User.__table__))
+    assert sql == "SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"
+
+    with pytest.raises(ValueError):
+        synthetic.Spec(users=3, subscriptions=10).validate()
@@ -0,0 +1,28 @@
+import pytest
+from httpx import AsyncClient
+from jinja2 import FileSystemBytecodeCache
+
+from app import metrics, templating
+
+
+def test_precompile_fills_the_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(templating.env, "bytecode_cache", FileSystemBytecodeCache(str(tmp_path)))
+    templating.env.cache.clear()
+
+    names = templating.precompile_templates()
+    assert {"base.html", "index.html", "login.html", "post_detail.html"} <= set(names)
+    assert len(list(tmp_path.iterdir())) == len(names)
+
+    # A fresh environment loads the compiled code instead of parsing the sources again.
+    templating.env.cache.clear()
+    monkeypatch.setattr(templating.env, "_parse", lambda *args: pytest.fail("template was parsed"))
+    templating.precompile_templates()
+
+
+@pytest.mark.asyncio
+async def test_whole_page_renders_are_timed(client: AsyncClient):
+    before = metrics.template_render.count("login.html")
+    response = await client.get("/login")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert metrics.template_render.count("login.html") == before + 1
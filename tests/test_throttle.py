@@ -0,0 +1,187 @@
+import asyncio
+import sqlite3
+
+import pytest
+from httpx import AsyncClient
+
+from app.security import hashing
+from app.throttle import Bucket, LoginThrottle, MemoryBackend, SQLiteBackend, login_throttle
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_throttle(backend, clock: Clock) -> LoginThrottle:
+    return LoginThrottle(
+        backend,
+        ip=Bucket(10, 1.0),
+        account=Bucket(3, 0.5),
+        backoff_after=2,
+        backoff_base=4,
+        backoff_max=10,
+        enabled=True,
+        clock=clock,
+    )
+
+
+@pytest.mark.asyncio
+async def test_buckets_refill_and_backoff_doubles():
+    clock = Clock()
+    throttle = make_throttle(MemoryBackend(maxsize=100), clock)
+
+    assert [await throttle.check("1.1.1.1", "Alice") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await throttle.check("2.2.2.2", " alice") == pytest.approx(2.0)  # same account, other IP
+    assert await throttle.check("1.1.1.1", "bob") == 0.0
+    clock.now += 2
+    assert await throttle.check("1.1.1.1", "alice") == 0.0
+
+    clock.now += 100
+    await throttle.failed("3.3.3.3", "carol")
+    assert await throttle.check("3.3.3.3", "carol") == 0.0
+    await throttle.failed("3.3.3.3", "carol")
+    assert await throttle.check("3.3.3.3", "carol") == pytest.approx(4.0)
+    clock.now += 4
+    await throttle.failed("3.3.3.3", "carol")
+    assert await throttle.check("4.4.4.4", "carol") == pytest.approx(8.0)
+    clock.now += 8
+    await throttle.failed("3.3.3.3", "carol")
+    assert await throttle.check("4.4.4.4", "carol") == pytest.approx(10.0)  # capped
+
+    clock.now += 10
+    await throttle.succeeded("3.3.3.3", "carol")
+    assert await throttle.check("3.3.3.3", "carol") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_is_bounded():
+    throttle = make_throttle(MemoryBackend(maxsize=4), Clock())
+    for n in range(10):
+        await throttle.check(f"10.0.0.{n}", f"user{n}")
+    assert len(throttle.backend._states) == 4
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / "throttle.db")
+    first = make_throttle(SQLiteBackend(path), clock)
+    second = make_throttle(SQLiteBackend(path, maxsize=5, prune_every=5), clock)
+
+    assert await first.check("1.1.1.1", "alice") == 0.0
+    assert await second.check("1.1.1.1", "alice") == 0.0
+    assert await first.check("1.1.1.1", "alice") == 0.0
+    assert await second.check("1.1.1.1", "alice") == pytest.approx(2.0)
+
+    for n in range(20):
+        clock.now += 1
+        await second.check(f"10.0.0.{n}", "alice")
+    rows = second.backend._db.execute("SELECT count(*) FROM login_throttle").fetchone()[0]
+    assert rows <= 5 + second.backend.prune_every
+
+
+@pytest.mark.asyncio
+async def test_logging_into_an_owned_account_does_not_lift_an_ip_lockout():
+    clock = Clock()
+    throttle = make_throttle(MemoryBackend(maxsize=100), clock)
+    for victim in ("alice", "bob"):
+        await throttle.failed("6.6.6.6", victim)
+    assert await throttle.check("6.6.6.6", "carol") == pytest.approx(4.0)
+
+    await throttle.succeeded("6.6.6.6", "mallory")
+    assert await throttle.check("6.6.6.6", "carol") == pytest.approx(4.0)
+    clock.now += 4
+    assert await throttle.check("6.6.6.6", "carol") == 0.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_failures_stay_bounded_and_are_forgotten_after_a_quiet_spell(backend, tmp_path):
+    clock = Clock()
+    store = MemoryBackend(maxsize=100) if backend == "memory" else SQLiteBackend(str(tmp_path / "throttle.db"))
+    throttle = make_throttle(store, clock)
+    throttle.backoff_base = 4.0  # a float, as read from the environment
+    throttle.backoff_reset = 60
+
+    # A shared NAT with years of typos: the delay stays capped and nothing overflows.
+    for _ in range(5000):
+        await throttle.failed("5.5.5.5", "someone")
+        clock.now += 1
+    assert await throttle.check("5.5.5.5", "other") == pytest.approx(9.0)
+
+    # Once the lockout has passed and the key stayed quiet, one typo doesn't lock it again.
+    clock.now += 10 + 61
+    await throttle.failed("5.5.5.5", "newcomer")
+    assert await throttle.check("5.5.5.5", "newcomer") == 0.0
+
+
+def test_sqlite_backend_upgrades_an_older_state_file(tmp_path):
+    path = str(tmp_path / "throttle.db")
+    old = sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE login_throttle (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+        "updated_at REAL NOT NULL, failures INTEGER NOT NULL, blocked_until REAL NOT NULL)"
+    )
+    old.execute("INSERT INTO login_throttle VALUES ('ip:1.1.1.1', 1.0, 1000.0, 3, 0.0)")
+    old.commit()
+    old.close()
+
+    backend = SQLiteBackend(path)
+    assert backend._transaction("ip:1.1.1.1", lambda state: (state, state)).failures == 3
+
+
+@pytest.mark.asyncio
+async def test_a_held_sqlite_lock_lets_attempts_through_without_blocking(tmp_path):
+    path = str(tmp_path / "throttle.db")
+    throttle = make_throttle(SQLiteBackend(path, busy_timeout_ms=50), Clock())
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    try:
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        assert await throttle.check("1.1.1.1", "alice") == 0.0
+        task.cancel()
+        assert ticks > 3  # the event loop kept running while the update waited for the lock
+    finally:
+        other_worker.execute("ROLLBACK")
+        other_worker.close()
+
+
+@pytest.mark.asyncio
+async def test_throttled_logins_skip_bcrypt_and_the_database(client: AsyncClient, queries, monkeypatch):
+    await client.post("/register", data={"email": "t@example.com", "login": "target", "password": "password123"})
+    verified = []
+    verify = hashing.verify
+
+    async def counting_verify(password: str, password_hash: str) -> bool:
+        verified.append(password)
+        return await verify(password, password_hash)
+
+    monkeypatch.setattr(hashing, "verify", counting_verify)
+    statuses = [
+        (await client.post("/login", data={"login": "target", "password": f"wrong{n}"})).status_code for n in range(8)
+    ]
+    assert statuses[:5] == [400] * 5
+    assert statuses[5:] == [429] * 3
+    assert len(verified) == 5
+
+    queries.reset()
+    response = await client.post("/login", data={"login": "TARGET", "password": "password123"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert queries.count == 0 and len(verified) == 5
+
+    login_throttle.backend.clear()
+    response = await client.post("/login", data={"login": "target", "password": "password123"})
+    assert response.status_code == 303